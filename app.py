@@ -1,129 +1,393 @@
 import gradio as gr
-import faiss
+import atexit
 import json
-import re
-import html
+import os
+import queue
+import threading
 import time
-from sentence_transformers import SentenceTransformer, util
-from src.generation.generate_answers import generate_answer
+from concurrent.futures import ThreadPoolExecutor
+from src.generation.answer_cache import SemanticAnswerCache
+from src.generation.context_packer import cleaned_text
+from src.generation.generate_answers import stream_answer
+from src.generation.scheduler import GenerationScheduler, SchedulerBusy
+from src.evaluation.answer_metrics import cosine_scores, keyword_scores
+from src.retrieval.embedding_backend import load_encoder
+from src.retrieval.index_factory import index_fingerprint, load_index, load_vector_lookup
+from src.retrieval.doc_store import load_docs
+from src.retrieval.query_cache import LRUCache
+from src.retrieval.bm25 import BM25Index
+from src.retrieval.hybrid import reciprocal_rank_fusion
+from src.retrieval.reranker import Reranker
+from src.retrieval.retrieval_client import RetrievalClient, resolve_url
+from src import tracing
+from src.tracing import NOOP_TRACE
 
 # === Config ===
-RAG_INDEX_PATH = 'data/processed/faiss_rag.index'
-CTX_INDEX_PATH = 'data/processed/faiss_contextual.index'
-RAG_DOCS_PATH = 'data/processed/rag_docs.jsonl'
-CTX_DOCS_PATH = 'data/processed/contextual_docs.jsonl'
-LOG_PATH = "evaluation_logs.jsonl"
+RAG_INDEX_PATH = os.environ.get('RAG_INDEX_PATH', 'data/processed/faiss_rag.index')
+CTX_INDEX_PATH = os.environ.get('CTX_INDEX_PATH', 'data/processed/faiss_contextual.index')
+RAG_DOCS_PATH = os.environ.get('RAG_DOCS_PATH', 'data/processed/rag_docs.jsonl')
+CTX_DOCS_PATH = os.environ.get('CTX_DOCS_PATH', 'data/processed/contextual_docs.jsonl')
+RAG_BM25_PATH = os.environ.get('RAG_BM25_PATH', 'data/processed/bm25_rag')
+CTX_BM25_PATH = os.environ.get('CTX_BM25_PATH', 'data/processed/bm25_contextual')
+LOG_PATH = os.environ.get('EVAL_LOG_PATH', "evaluation_logs.jsonl")
 EMBED_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
 TOP_K = 5
 SIM_THRESHOLD = 0.7
 KEYWORD_THRESHOLD = 0.5
 OLLAMA_MODEL = 'gemma3:latest'
+QUERY_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 4096
+CACHE_TTL = 3600  # seconds
+HYBRID_SEARCH = os.environ.get('HYBRID_SEARCH', '1') == '1'  # fuse BM25 with FAISS when available
+HYBRID_CANDIDATES = 20  # per-engine depth fed into reciprocal-rank fusion
+RERANK = os.environ.get('RERANK', '0') == '1'  # cross-encoder rerank between search and generation
+RERANK_CANDIDATES = 20  # FAISS candidates scored by the cross-encoder
+RERANK_KEEP = 3  # chunks sent to Ollama after reranking
+RERANK_BUDGET_MS = float(os.environ.get('RERANK_BUDGET_MS', 150))
+RETRIEVAL_SERVER_URL = resolve_url()  # micro-batching retrieval server, if one is configured
+FAISS_MMAP = os.environ.get('FAISS_MMAP', '1') == '1'  # map index vectors instead of reading them
+STARTUP_WORKERS = 4  # background loaders for metadata and gold answers
+ANSWER_CACHE = os.environ.get('ANSWER_CACHE', '1') == '1'  # reuse answers for near-duplicate questions
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', 0.95))
+ANSWER_CACHE_SIZE = 2048
+ANSWER_CACHE_TTL = 24 * 3600  # seconds
+ANSWER_CACHE_PATH = os.environ.get('ANSWER_CACHE_PATH')  # directory; unset keeps the cache in memory only
+# Bounded Ollama concurrency: OLLAMA_CONCURRENCY, OLLAMA_MAX_QUEUE, OLLAMA_QUEUE_TIMEOUT; see src/generation/scheduler.py
+# Per-stage tracing: TRACING=1, TRACE_LOG_PATH (JSONL), METRICS_PORT (Prometheus /metrics); see src/tracing.py
 
-# === Load model and indexes ===
-model = SentenceTransformer(EMBED_MODEL_NAME)
-rag_index = faiss.read_index(RAG_INDEX_PATH)
-contextual_index = faiss.read_index(CTX_INDEX_PATH)
-
-# === Load chunk metadata ===
-with open(RAG_DOCS_PATH, 'r', encoding='utf-8') as f:
-    rag_docs = [json.loads(line) for line in f]
-
-with open(CTX_DOCS_PATH, 'r', encoding='utf-8') as f:
-    contextual_docs = [json.loads(line) for line in f]
-
-# === Preload gold answers (from prior eval logs) ===
-gold_answers = {}
-try:
-    with open(LOG_PATH, 'r', encoding='utf-8') as f:
-        for line in f:
-            entry = json.loads(line)
-            if "gold_answer" in entry:
-                gold_answers[entry["query"]] = entry["gold_answer"]
-except FileNotFoundError:
-    pass
+# === Startup ===
+# Only what the first query needs is loaded before the app reports ready:
+# the encoder and the memory-mapped indexes. Chunk metadata and gold
+# answers load on background threads and are awaited on first use.
+startup_timings = {}
+_startup_start = time.perf_counter()
+_loader = ThreadPoolExecutor(max_workers=STARTUP_WORKERS, thread_name_prefix="startup")
+
+def timed_phase(name, fn, *args, **kwargs):
+    """Run one startup phase and log how long it took."""
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    startup_timings[name] = round(time.perf_counter() - start, 3)
+    print(f"⏱️ startup {name}: {startup_timings[name]:.2f}s")
+    return value
+
+class Background:
+    """A startup phase run on a background thread; ``get()`` waits for it."""
+
+    def __init__(self, name, fn, *args):
+        self._future = _loader.submit(timed_phase, name, fn, *args)
+
+    def get(self):
+        return self._future.result()
+
+def load_bm25(path, index):
+    """The BM25 index at ``path``, if hybrid search is on and it covers ``index``'s corpus."""
+    if not (HYBRID_SEARCH and os.path.isdir(path)):
+        return None
+    bm25 = BM25Index.load(path)
+    if bm25.num_docs != index.ntotal:
+        print(f"⚠️ Skipping {path}: {bm25.num_docs} docs, but the dense index has {index.ntotal}; rebuild it")
+        return None
+    return bm25
+
+def load_gold_answers(path):
+    """Gold answers from prior eval logs, keyed by query."""
+    answers = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if "gold_answer" in entry:
+                    answers[entry["query"]] = entry["gold_answer"]
+    except FileNotFoundError:
+        pass
+    return answers
+
+def embed_gold_answers():
+    """Gold answers are embedded once, in one batch, instead of per request."""
+    answers = gold_answers.get()
+    if not answers:
+        return {}
+    vecs = model.encode(list(answers.values()), convert_to_numpy=True, normalize_embeddings=True)
+    return dict(zip(answers.keys(), vecs))
+
+def warm_up():
+    """One encode and one search per index, so the first user query is not the slow one."""
+    vec = model.encode(["warm-up query"], convert_to_numpy=True)
+    for index in (rag_index, contextual_index):
+        try:
+            index.search(vec, 1)
+        except RuntimeError as e:  # every shard down; they restart on the next query
+            print(f"⚠️ Warm-up search failed: {e}")
+
+# Background: chunk metadata and the eval-log scan
+rag_docs = Background("rag_docs", load_docs, RAG_DOCS_PATH)
+contextual_docs = Background("contextual_docs", load_docs, CTX_DOCS_PATH)
+gold_answers = Background("gold_answers", load_gold_answers, LOG_PATH)
+
+# Foreground: model and indexes
+model = timed_phase("model", load_encoder, EMBED_MODEL_NAME)  # EMBED_BACKEND=torch|onnx|onnx-int8
+rag_index = timed_phase("rag_index", load_index, RAG_INDEX_PATH, mmap=FAISS_MMAP)
+contextual_index = timed_phase("contextual_index", load_index, CTX_INDEX_PATH, mmap=FAISS_MMAP)
+rag_vectors = load_vector_lookup(rag_index, RAG_INDEX_PATH)
+contextual_vectors = load_vector_lookup(contextual_index, CTX_INDEX_PATH)
+rag_bm25 = timed_phase("rag_bm25", load_bm25, RAG_BM25_PATH, rag_index)
+contextual_bm25 = timed_phase("contextual_bm25", load_bm25, CTX_BM25_PATH, contextual_index)
+reranker = timed_phase("reranker", Reranker, budget_ms=RERANK_BUDGET_MS) if RERANK else None
+retrieval_client = RetrievalClient(RETRIEVAL_SERVER_URL) if RETRIEVAL_SERVER_URL else None
+gold_embeddings = Background("gold_embeddings", embed_gold_answers)
+
+# === Query caches (shared by both pipelines) ===
+query_embedding_cache = LRUCache(QUERY_CACHE_SIZE, CACHE_TTL)
+retrieval_cache = LRUCache(RESULT_CACHE_SIZE, CACHE_TTL)
+answer_cache = None
+if ANSWER_CACHE:
+    answer_cache = timed_phase("answer_cache", SemanticAnswerCache, ANSWER_CACHE_THRESHOLD,
+                               ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_PATH,
+                               index_fingerprint(RAG_INDEX_PATH, RAG_DOCS_PATH, CTX_INDEX_PATH, CTX_DOCS_PATH))
+    if ANSWER_CACHE_PATH:
+        atexit.register(answer_cache.save)
+
+generation_scheduler = GenerationScheduler()
+
+timed_phase("warm_up", warm_up)
+startup_timings["ready"] = round(time.perf_counter() - _startup_start, 3)
+print(f"✅ Ready in {startup_timings['ready']:.2f}s (metadata keeps loading in the background)")
 
 # === Utility functions ===
-def clean_html(text):
-    """Strip HTML tags and unescape entities."""
-    if not isinstance(text, str):
-        return ""
-    no_tags = re.sub(r"<[^>]*>", "", text)
-    return html.unescape(no_tags)
-
-def search_index(query, index, docs):
-    query_vec = model.encode([query], convert_to_numpy=True)
-    distances, indices = index.search(query_vec, TOP_K)
-    results = [docs[i] for i in indices[0]]
-    return results
-
-def jaccard(a, b):
-    """Compute Jaccard similarity between two strings.
-    
-    Args:
-        a (str): The first string.
-        b (str): The second string.
-    
-    Returns:
-        float: The Jaccard similarity between the two strings.
-    
-    Raises:
-        TypeError: If either `a` or `b` is not a string.
+def encode_query(query, trace=NOOP_TRACE):
+    """Query embedding, encoded once per distinct query across pipelines."""
+    def compute():
+        with trace.span("query_encode"):
+            vec = model.encode([query], convert_to_numpy=True)
+        vec.flags.writeable = False
+        return vec
+    return query_embedding_cache.get_or_compute(query, compute)
+
+def dense_search(query, index, name, k, trace=NOOP_TRACE):
+    """Dense top-``k`` row IDs and the shards missing from them.
+
+    Uses the retrieval server when configured.
+    """
+    if retrieval_client is not None:
+        with trace.span("retrieval_server", k=k):
+            _, ids = retrieval_client.search(query, name, k)
+        return ids, []
+    vec = encode_query(query, trace)
+    with trace.span("faiss_search", k=k) as span:
+        if hasattr(index, "search_partial"):
+            distances, indices, failed = index.search_partial(vec, k)
+            span.set(failed_shards=len(failed))
+        else:
+            distances, indices = index.search(vec, k)
+            failed = []
+    return indices[0], failed
+
+def search_index(query, index, docs, name, bm25=None, k=TOP_K, trace=NOOP_TRACE):
+    """Top-``k`` row IDs and docs; IDs are cached per ``(index, query, k)``.
+
+    With a BM25 index, dense and sparse candidates are fused with RRF.
+    Results missing a failed shard are returned but not cached, so the
+    next request retries them.
+    """
+    computed = []
+    def compute():
+        computed.append(True)
+        if bm25 is None:
+            dense_ids, failed = dense_search(query, index, name, k, trace)
+            return tuple(int(i) for i in dense_ids if i >= 0), tuple(f["shard"] for f in failed)
+        depth = max(k, HYBRID_CANDIDATES)
+        dense_ids, failed = dense_search(query, index, name, depth, trace)
+        with trace.span("bm25_search", k=depth):
+            sparse_ids, _ = bm25.search(query, depth)
+        fused = tuple(reciprocal_rank_fusion([dense_ids, sparse_ids], limit=k))
+        return fused, tuple(f["shard"] for f in failed)
+    ids, failed = retrieval_cache.get_or_compute((name, query, k), compute, cacheable=lambda r: not r[1])
+    trace.set(retrieval_cached=not computed)
+    if failed:
+        tracing.incr("shard_failures_total", len(failed), pipeline=name)
+    with trace.span("metadata_fetch", rows=len(ids)):
+        return ids, [docs[i] for i in ids]
+
+def cache_stats():
+    stats = {
+        "query_embeddings": query_embedding_cache.stats(),
+        "retrieval_results": retrieval_cache.stats(),
+    }
+    if answer_cache is not None:
+        stats["answers"] = answer_cache.stats()
+    return stats
+
+def scheduler_stats():
+    return generation_scheduler.stats()
+
+def metric_samples():
+    """Cache counters and startup timings, read when /metrics is scraped."""
+    samples = []
+    for cache, stats in cache_stats().items():
+        samples.append(("cache_hits_total", {"cache": cache}, stats["hits"], "counter"))
+        samples.append(("cache_misses_total", {"cache": cache}, stats["misses"], "counter"))
+        samples.append(("cache_entries", {"cache": cache}, stats["size"], "gauge"))
+    for phase, seconds in startup_timings.items():
+        samples.append(("startup_seconds", {"phase": phase}, seconds, "gauge"))
+    sched = scheduler_stats()
+    samples.append(("generations_running", {}, sched["running"], "gauge"))
+    samples.append(("generations_queued", {}, sched["queued"], "gauge"))
+    samples.append(("generations_rejected_total", {"reason": "queue_full"}, sched["rejected"], "counter"))
+    samples.append(("generations_rejected_total", {"reason": "timeout"}, sched["timeouts"], "counter"))
+    return samples
+
+tracing.registry.register_collector(metric_samples)
+if tracing.ENABLED and tracing.METRICS_PORT:
+    tracing.start_metrics_server()
+    print(f"📈 Metrics on http://localhost:{tracing.METRICS_PORT}/metrics")
+
+def run_eval(gold_answer, chunks, chunk_vecs, gold_vec=None):
+    """Keyword and semantic hit counts for the retrieved chunks.
+
+    ``chunk_vecs`` are the stored index vectors of the retrieved rows, so
+    nothing but (at most) the gold answer is encoded here.
     """
-    if not isinstance(a, str) or not isinstance(b, str):
-        raise TypeError("Both inputs to the jaccard function must be strings.")
-    a_set = set(a.lower().split())
-    b_set = set(b.lower().split())
-    union = a_set | b_set
-    if not union:
-        return 0.0
-    return len(a_set & b_set) / len(union)
-
-def run_eval(gold_answer, chunks):
-    keyword_hits = 0
-    gold_emb = model.encode(gold_answer, convert_to_tensor=True)
-    chunk_embs = model.encode(chunks, convert_to_tensor=True)
-    cos_scores = util.cos_sim(gold_emb, chunk_embs)[0]
-    semantic_hits = sum(1 for score in cos_scores if score >= SIM_THRESHOLD)
-    for chunk in chunks:
-        if jaccard(gold_answer, chunk) >= KEYWORD_THRESHOLD:
-            keyword_hits += 1
+    if gold_vec is None:
+        gold_vec = model.encode(gold_answer, convert_to_numpy=True)
+    semantic_hits = int((cosine_scores(gold_vec, chunk_vecs) >= SIM_THRESHOLD).sum())
+    keyword_hits = int((keyword_scores(gold_answer, chunks) >= KEYWORD_THRESHOLD).sum())
     return keyword_hits, semantic_hits
 
-def run_rag(query, evaluate):
-    gold = gold_answers.get(query)
+def run_pipeline(query, evaluate, index, docs, vectors, name, bm25=None):
+    """Stream (answer, sources, metrics) updates for one retrieval pipeline."""
+    trace = tracing.start_trace(name, query=query, model=OLLAMA_MODEL)
+    try:
+        yield from pipeline_updates(query, evaluate, index, docs, vectors, name, bm25, trace)
+    except Exception as e:
+        trace.finish(error=e)
+        raise
+    finally:
+        trace.finish()
+
+def pipeline_updates(query, evaluate, index, docs, vectors, name, bm25, trace):
     start = time.time()
-    retrieved = search_index(query, rag_index, rag_docs)
-    chunks = [clean_html(r.get("chunk", r.get("text", ""))) for r in retrieved]
-    answer = generate_answer(query, retrieved, model=OLLAMA_MODEL)
-    duration = round(time.time() - start, 2)
+    rerank_note = ""
+    if reranker is None:
+        ids, retrieved = search_index(query, index, docs, name, bm25, trace=trace)
+        with trace.span("html_clean", chunks=len(retrieved)):
+            chunks = [cleaned_text(r) for r in retrieved]
+    else:
+        ids, retrieved = search_index(query, index, docs, name, bm25, k=RERANK_CANDIDATES, trace=trace)
+        with trace.span("html_clean", chunks=len(retrieved)):
+            chunks = [cleaned_text(r) for r in retrieved]
+        with trace.span("rerank") as span:
+            order, stats = reranker.rerank(query, ids, chunks)
+            span.set(**stats)
+        order = order[:RERANK_KEEP]
+        ids = tuple(ids[i] for i in order)
+        retrieved = [retrieved[i] for i in order]
+        chunks = [chunks[i] for i in order]
+        rerank_note = f"\n🔀 Reranked {stats['scored'] + stats['cached']}/{stats['candidates']} in {stats['latency_ms']:.0f} ms"
+        if stats["fallback"]:
+            rerank_note += f" (fell back to search order: {stats['fallback']})"
     sources = "\n\n".join([f"• {c[:300]}..." for c in chunks])
-    metrics = ""
-    if evaluate:
-        if gold:
-            k, s = run_eval(gold, chunks)
-            metrics = f"✅ Semantic Recall@{TOP_K}: {s}/{TOP_K}\n🔎 Keyword Recall@{TOP_K}: {k}/{TOP_K}"
-        else:
-            metrics = "⚠️ No gold answer available for this query."
-    answer += f"\n\n⏱️ Generated in {duration}s"
-    return answer.strip(), sources, metrics
+    retrieval_s = time.time() - start
 
-def run_contextual(query, evaluate):
-    gold = gold_answers.get(query)
-    start = time.time()
-    retrieved = search_index(query, contextual_index, contextual_docs)
-    chunks = [clean_html(r.get("chunk", r.get("text", ""))) for r in retrieved]
-    answer = generate_answer(query, retrieved, model=OLLAMA_MODEL)
+    answer = ""
+    cache_note = ""
+    queue_s = generation_s = 0.0
+    cached = None
+    if answer_cache is not None:
+        query_vec = encode_query(query, trace)
+        with trace.span("answer_cache") as span:
+            cached = answer_cache.get(query_vec, ids, f"{name}:{OLLAMA_MODEL}")
+            span.set(hit=cached is not None)
+    if cached is not None:
+        answer = cached["answer"]
+        cache_note = f"\n♻️ Cached answer (similarity {cached['similarity']:.3f} to \"{cached['query'][:80]}\")"
+        yield answer, sources, ""
+    else:
+        try:
+            with generation_scheduler.slot() as slot:
+                queue_s = slot.wait_s
+                trace.add("queue_wait", queue_s)
+                generation_start = time.time()
+                for token in stream_answer(query, retrieved, model=OLLAMA_MODEL, trace=trace):
+                    answer += token
+                    yield answer, sources, ""
+                generation_s = time.time() - generation_start
+        except SchedulerBusy as e:
+            trace.set(rejected=str(e))
+            answer = f"⏳ The model is busy: {e}. Please try again shortly."
+        else:
+            if answer_cache is not None and answer.strip():
+                answer_cache.put(query_vec, ids, answer, f"{name}:{OLLAMA_MODEL}", query)
     duration = round(time.time() - start, 2)
-    sources = "\n\n".join([f"• {c[:300]}..." for c in chunks])
+
     metrics = ""
     if evaluate:
-        if gold:
-            k, s = run_eval(gold, chunks)
-            metrics = f"✅ Semantic Recall@{TOP_K}: {s}/{TOP_K}\n🔎 Keyword Recall@{TOP_K}: {k}/{TOP_K}"
-        else:
-            metrics = "⚠️ No gold answer available for this query."
-    answer += f"\n\n⏱️ Generated in {duration}s"
-    return answer.strip(), sources, metrics
+        with trace.span("online_eval") as span:
+            gold = gold_answers.get().get(query)
+            if gold:
+                chunk_vecs = vectors(ids) if vectors is not None else model.encode(chunks, convert_to_numpy=True)
+                k, s = run_eval(gold, chunks, chunk_vecs, gold_embeddings.get().get(query))
+                n = len(chunks)
+                metrics = f"✅ Semantic Recall@{n}: {s}/{n}\n🔎 Keyword Recall@{n}: {k}/{n}"
+                span.set(semantic_hits=s, keyword_hits=k, chunks=n)
+            else:
+                metrics = "⚠️ No gold answer available for this query."
+                span.set(gold=False)
+    answer += f"\n\n⏱️ Generated in {duration}s (retrieval {retrieval_s:.2f}s, queue {queue_s:.2f}s, generation {generation_s:.2f}s){rerank_note}{cache_note}"
+    yield answer.strip(), sources, metrics
+
+def run_rag(query, evaluate):
+    yield from run_pipeline(query, evaluate, rag_index, rag_docs.get(), rag_vectors, "rag", rag_bm25)
+
+def run_contextual(query, evaluate):
+    yield from run_pipeline(query, evaluate, contextual_index, contextual_docs.get(), contextual_vectors, "contextual", contextual_bm25)
+
+def run_both(query, evaluate):
+    """Stream both pipelines' updates as one 6-tuple per change.
+
+    The query is encoded once up front and shared through the embedding
+    cache. Each pipeline then runs on its own thread, so both retrievals
+    and both generations proceed concurrently. Generations still go
+    through ``generation_scheduler``, which bounds how many reach Ollama.
+    """
+    if retrieval_client is None:
+        encode_query(query)
+    updates = queue.Queue()
+    stop = threading.Event()
+
+    def drive(slot, pipeline):
+        gen = pipeline(query, evaluate)
+        try:
+            for update in gen:
+                if stop.is_set():
+                    break
+                updates.put((slot, update))
+        except Exception as e:
+            updates.put((slot, (f"❌ {type(e).__name__}: {e}", "", "")))
+        finally:
+            gen.close()
+            updates.put((slot, None))
+
+    for slot, pipeline in enumerate((run_rag, run_contextual)):
+        threading.Thread(target=drive, args=(slot, pipeline), name=f"compare-{slot}", daemon=True).start()
+
+    state = [("", "", ""), ("", "", "")]
+    running = 2
+    try:
+        while running:
+            slot, update = updates.get()
+            while True:  # coalesce whatever piled up while the UI was busy
+                if update is None:
+                    running -= 1
+                else:
+                    state[slot] = update
+                try:
+                    slot, update = updates.get_nowait()
+                except queue.Empty:
+                    break
+            yield (*state[0], *state[1])
+    finally:
+        stop.set()
 
 # === Gradio UI ===
 with gr.Blocks(title="RAG vs. Contextual Retrieval Comparison") as demo:
@@ -149,8 +413,10 @@ Ask a question. RAG and Contextual pipelines will update independently as result
                     ctx_chunks = gr.Textbox(label="Top Contextual Chunks", lines=6)
                     ctx_eval = gr.Textbox(label="Contextual Evaluation", lines=2)
 
-    run_btn.click(fn=run_rag, inputs=[query, evaluate], outputs=[rag_out, rag_chunks, rag_eval])
-    run_btn.click(fn=run_contextual, inputs=[query, evaluate], outputs=[ctx_out, ctx_chunks, ctx_eval])
+    # Admission is bounded by generation_scheduler, not by Gradio's per-event limit.
+    run_btn.click(fn=run_both, inputs=[query, evaluate],
+                  outputs=[rag_out, rag_chunks, rag_eval, ctx_out, ctx_chunks, ctx_eval],
+                  concurrency_limit=None)
     clear_btn.click(lambda: ("", "", "", "", "", ""), outputs=[rag_out, rag_chunks, rag_eval, ctx_out, ctx_chunks, ctx_eval])
 
 if __name__ == "__main__":
@@ -0,0 +1,287 @@
+# benchmarks/run_benchmarks.py
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to Python path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+RESULTS_DIR = ROOT / "benchmarks/results"
+EMBED_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+DIM = 384  # all-MiniLM-L6-v2 embedding size
+
+WORDS = ("index vector query python error faiss model search gradient matrix cache thread "
+         "latency memory token prompt answer chunk server request batch numpy html").split()
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "n": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def timed(fn, repeats):
+    """Run ``fn`` ``repeats`` times; return per-call latencies in ms."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+# === Synthetic corpus ===
+def make_texts(n, rng, min_words=40, max_words=200):
+    texts = []
+    for i in range(n):
+        words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+        texts.append(f"<p>Post {i}: " + " ".join(words) + ".</p>")
+    return texts
+
+
+def make_corpus(n_docs, seed=0):
+    """Random unit vectors plus matching doc metadata records."""
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).standard_normal((n_docs, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    docs = [
+        {"id": i // 4, "chunk_id": i % 4, "text": text, "source": "synthetic", "tags": None, "label": None}
+        for i, text in enumerate(make_texts(n_docs, rng))
+    ]
+    return vectors, docs
+
+
+# === Benchmarks ===
+def bench_encode(batch_sizes, n_texts, backend=None, seed=0):
+    from src.retrieval.embedding_backend import load_encoder
+
+    model = load_encoder(EMBED_MODEL_NAME, backend)
+    texts = make_texts(n_texts, random.Random(seed))
+    model.encode(texts[:8])  # warm-up
+    rows = []
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        elapsed = time.perf_counter() - start
+        rows.append({"batch_size": batch_size, "texts": n_texts, "texts_per_s": n_texts / elapsed})
+    return rows
+
+
+def bench_search(vectors, index_types, ks, n_queries, seed=0):
+    from src.retrieval.index_factory import build_index
+
+    queries = vectors[np.random.default_rng(seed + 1).choice(len(vectors), n_queries)]
+    queries = queries + 0.01 * np.random.default_rng(seed + 2).standard_normal(queries.shape).astype(np.float32)
+    rows = []
+    for index_type in index_types:
+        index = build_index(vectors, index_type)
+        for k in ks:
+            samples = []
+            for q in queries:
+                start = time.perf_counter()
+                index.search(q[None, :], k)
+                samples.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            index.search(queries, k)
+            batch_ms = (time.perf_counter() - start) * 1000
+            rows.append({"index_type": index_type, "k": k, **percentiles(samples),
+                         "batch_qps": n_queries / (batch_ms / 1000)})
+    return rows
+
+
+def bench_metadata(docs, n_lookups, k=5, seed=0):
+    from src.retrieval.doc_store import DocStore, write_doc_store
+
+    rng = np.random.default_rng(seed)
+    lookups = rng.integers(0, len(docs), size=(n_lookups, k))
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl_path = Path(tmp) / "docs.jsonl"
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json.dumps(doc) + "\n")
+        bin_path = Path(tmp) / "docs.bin"
+        write_doc_store(bin_path, docs)
+
+        start = time.perf_counter()
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            loaded = [json.loads(line) for line in f]
+        rows.append({"store": "jsonl", "open_ms": (time.perf_counter() - start) * 1000,
+                     **percentiles(timed(lambda: [loaded[i]["text"] for i in lookups[rng.integers(n_lookups)]], n_lookups))})
+
+        start = time.perf_counter()
+        store = DocStore(bin_path)
+        open_ms = (time.perf_counter() - start) * 1000
+        rows.append({"store": "doc_store", "open_ms": open_ms,
+                     **percentiles(timed(lambda: [store[i]["text"] for i in lookups[rng.integers(n_lookups)]], n_lookups))})
+        store.close()
+    return rows
+
+
+def bench_format_prompt(docs, chunk_counts, repeats):
+    from src.generation.generate_answers import format_prompt
+
+    rows = []
+    for n in chunk_counts:
+        chunks = docs[:n]
+        rows.append({"chunks": n, **percentiles(timed(lambda: format_prompt(chunks, "How do I tune a FAISS index?"), repeats))})
+    return rows
+
+
+def bench_end_to_end(vectors, docs, n_queries, first_token_delay, token_delay):
+    """Time ``app.run_rag`` / ``app.run_contextual`` / ``app.run_both`` against a stub Ollama."""
+    from src.generation.ollama_stub import StubOllamaServer
+    from src.retrieval.doc_store import write_doc_store
+    from src.retrieval.index_factory import build_index, save_index
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, \
+         StubOllamaServer(first_token_delay=first_token_delay, token_delay=token_delay) as stub:
+        for name in ("rag", "contextual"):
+            save_index(build_index(vectors), Path(tmp) / f"{name}.index")
+            with open(Path(tmp) / f"{name}_docs.jsonl", "w", encoding="utf-8") as f:
+                for doc in docs:
+                    f.write(json.dumps(doc) + "\n")
+            write_doc_store(Path(tmp) / f"{name}_docs.bin", docs)
+
+        os.environ.update({
+            "RAG_INDEX_PATH": str(Path(tmp) / "rag.index"),
+            "CTX_INDEX_PATH": str(Path(tmp) / "contextual.index"),
+            "RAG_DOCS_PATH": str(Path(tmp) / "rag_docs.jsonl"),
+            "CTX_DOCS_PATH": str(Path(tmp) / "contextual_docs.jsonl"),
+            "RAG_BM25_PATH": str(Path(tmp) / "no_bm25"),
+            "CTX_BM25_PATH": str(Path(tmp) / "no_bm25"),
+            "EVAL_LOG_PATH": str(Path(tmp) / "no_logs.jsonl"),
+            "OLLAMA_HOST": stub.url,
+            "ANSWER_CACHE": "0",  # measure generation, not cache hits
+        })
+        import app
+
+        rng = random.Random(0)
+        for name, fn in (("run_rag", app.run_rag), ("run_contextual", app.run_contextual),
+                         ("run_both", app.run_both)):
+            ttft, total = [], []
+            for i in range(n_queries):
+                query = f"question {i} about " + " ".join(rng.choices(WORDS, k=6))
+                start = time.perf_counter()
+                first = None
+                for _ in fn(query, False):
+                    if first is None:
+                        first = time.perf_counter()
+                end = time.perf_counter()
+                ttft.append((first - start) * 1000)
+                total.append((end - start) * 1000)
+            rows.append({"pipeline": name, "stub_first_token_delay_s": first_token_delay,
+                         "time_to_first_token": percentiles(ttft), "total": percentiles(total)})
+    return rows
+
+
+# === Driver ===
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_section(results, name, fn, *args):
+    print(f"⏱️ {name}...")
+    try:
+        results[name] = fn(*args)
+    except ImportError as e:
+        print(f"⚠️ Skipping {name}: {e}")
+        results[name] = {"skipped": str(e)}
+
+
+def compare(baseline_path, current):
+    """Print p50 / throughput ratios against a previous results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n📊 Compared with {baseline['meta']['commit']} ({baseline_path}):")
+    for section, rows in current["results"].items():
+        old_rows = baseline["results"].get(section)
+        if not isinstance(rows, list) or not isinstance(old_rows, list):
+            continue
+        for new, old in zip(rows, old_rows):
+            for metric in ("p50_ms", "texts_per_s", "batch_qps"):
+                if metric in new and metric in old and old[metric]:
+                    label = {k: v for k, v in new.items() if isinstance(v, (str, int)) and k != "n"}
+                    print(f"  {section} {label} {metric}: {old[metric]:.3f} → {new[metric]:.3f} "
+                          f"({new[metric] / old[metric]:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval and generation hot paths.")
+    parser.add_argument("--docs", type=int, default=20000, help="Synthetic corpus size.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--index-types", nargs="+", default=["flat", "ivf_flat", "hnsw"])
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 5, 10, 50])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32, 128])
+    parser.add_argument("--skip-encode", action="store_true", help="Skip the model.encode benchmark.")
+    parser.add_argument("--embed-backend", choices=("torch", "onnx", "onnx-int8"),
+                        help="Encoder backend for the encode benchmark (default: EMBED_BACKEND or torch).")
+    parser.add_argument("--skip-e2e", action="store_true", help="Skip the end-to-end app benchmark.")
+    parser.add_argument("--stub-first-token-delay", type=float, default=0.05)
+    parser.add_argument("--stub-token-delay", type=float, default=0.005)
+    parser.add_argument("--output", type=Path, help="Results JSON (default benchmarks/results/<time>-<commit>.json).")
+    parser.add_argument("--compare", type=Path, help="Previous results JSON to compare against.")
+    args = parser.parse_args()
+
+    vectors, docs = make_corpus(args.docs)
+    results = {}
+    if not args.skip_encode:
+        run_section(results, "encode", bench_encode, args.batch_sizes, 512, args.embed_backend)
+    run_section(results, "search", bench_search, vectors, args.index_types, args.k, args.queries)
+    run_section(results, "metadata", bench_metadata, docs, args.queries)
+    run_section(results, "format_prompt", bench_format_prompt, docs, [5, 10], args.queries)
+    if not args.skip_e2e:
+        run_section(results, "end_to_end", bench_end_to_end, vectors, docs, min(args.queries, 50),
+                    args.stub_first_token_delay, args.stub_token_delay)
+
+    import faiss
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "faiss": faiss.__version__,
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{report['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results saved to {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,28 @@
-from sentence_transformers import SentenceTransformer
-import faiss
-import json
+import os
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.retrieval.embedding_backend import load_encoder
+from src.retrieval.index_factory import load_index
+from src.retrieval.doc_store import load_docs
 
 INDEX_PATH = 'data/processed/faiss_contextual.index'
 DOCS_PATH = 'data/processed/contextual_docs.jsonl'
 EMBED_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
 
 # Load index + model
-model = SentenceTransformer(EMBED_MODEL_NAME)
-index = faiss.read_index(INDEX_PATH)
+model = load_encoder(EMBED_MODEL_NAME)
+index = load_index(INDEX_PATH)
 
 # Load metadata
-with open(DOCS_PATH, 'r', encoding='utf-8') as f:
-    docs = [json.loads(line) for line in f]
+docs = load_docs(DOCS_PATH)
 
 def retrieve(query, top_k=5):
     vec = model.encode([query], convert_to_numpy=True)
     scores, indices = index.search(vec, top_k)
-    return [docs[i] for i in indices[0]]
+    return [docs[i] for i in indices[0] if i >= 0]
 
 # Example query
 query = "What are the differences between PCA and L1 regularization?"
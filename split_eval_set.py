@@ -1,37 +1,48 @@
+import argparse
 import json
-import random
-from collections import defaultdict
 
-INPUT_PATH = "data/processed/chunked_documents.jsonl"
-TRAIN_OUT = "data/processed/chunked_documents_train.jsonl"
+from src.data_preparation.columnar import RecordWriter, input_path, iter_records, output_path
+from src.data_preparation.splitting import EVAL_RATIO, SPLIT_SALT, is_eval
+
+INPUT_PATH = input_path("data/processed/chunked_documents.jsonl")
+TRAIN_OUT = output_path("data/processed/chunked_documents_train.jsonl")
 EVAL_OUT = "data/processed/eval_questions.jsonl"
 
-SPLIT_RATIO = 0.1  # 10% for evaluation
-
-# Group chunks by question ID
-by_id = defaultdict(list)
-with open(INPUT_PATH, "r", encoding="utf-8") as f:
-    for line in f:
-        item = json.loads(line)
-        by_id[item["id"]].append(item)
-
-# Sample 10% of question IDs for evaluation
-all_ids = list(by_id.keys())
-eval_ids = set(random.sample(all_ids, int(len(all_ids) * SPLIT_RATIO)))
-
-with open(TRAIN_OUT, "w", encoding="utf-8") as train_f, \
-     open(EVAL_OUT, "w", encoding="utf-8") as eval_f:
-
-    for qid, chunks in by_id.items():
-        if qid in eval_ids:
-            eval_entry = {
-                "question": chunks[0]["chunk"].split('\n')[-1][:300],  # crude title guess
-                "relevant_chunk_ids": [c["chunk_id"] for c in chunks],
-                "id": qid
-            }
-            eval_f.write(json.dumps(eval_entry) + "\n")
-        else:
-            for c in chunks:
-                train_f.write(json.dumps(c) + "\n")
-
-print(f"✅ Wrote {len(eval_ids)} questions to eval set.")
+SPLIT_RATIO = EVAL_RATIO  # 10% for evaluation
+
+def split_chunks(input_file=INPUT_PATH, train_out=TRAIN_OUT, eval_out=EVAL_OUT, ratio=SPLIT_RATIO, salt=SPLIT_SALT):
+    """Split chunked posts by a hash of their ID in one streaming pass.
+
+    Train chunks are written as they are read. Only the eval questions
+    (a ``ratio`` share of posts, one small entry each) are held in memory.
+    """
+    eval_entries = {}
+    with RecordWriter(train_out) as train_f:
+        for item in iter_records(input_file):
+            qid = item["id"]
+            if not is_eval(qid, ratio, salt):
+                train_f.write(item)
+            elif qid in eval_entries:
+                eval_entries[qid]["relevant_chunk_ids"].append(item["chunk_id"])
+            else:
+                eval_entries[qid] = {
+                    "question": item["chunk"].split('\n')[-1][:300],  # crude title guess
+                    "relevant_chunk_ids": [item["chunk_id"]],
+                    "id": qid
+                }
+
+    with open(eval_out, "w", encoding="utf-8") as eval_f:
+        for entry in eval_entries.values():
+            eval_f.write(json.dumps(entry) + "\n")
+    return len(eval_entries)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split chunked posts into train chunks and eval questions.")
+    parser.add_argument("--ratio", type=float, default=SPLIT_RATIO)
+    parser.add_argument("--salt", default=SPLIT_SALT)
+    args = parser.parse_args(argv)
+    n = split_chunks(ratio=args.ratio, salt=args.salt)
+    print(f"✅ Wrote {n} questions to eval set.")
+
+if __name__ == "__main__":
+    main()
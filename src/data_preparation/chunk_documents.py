@@ -1,57 +1,242 @@
+import argparse
 import json
+import os
 import re
 import sys
+import threading
+from multiprocessing import Pool
 from pathlib import Path
 from tqdm import tqdm
 
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.data_preparation.columnar import RecordWriter, input_path, is_parquet, iter_records, output_path
+from src.text_utils import split_sentences
+
 # Defaults (fallback if not provided as CLI args)
-DEFAULT_INPUT_PATH = (
+DEFAULT_INPUT_PATH = input_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/combined.jsonl"
 )
-DEFAULT_OUTPUT_PATH = (
+DEFAULT_OUTPUT_PATH = output_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/chunked_documents.jsonl"
 )
+INPUT_COLUMNS = ["id", "title", "body", "source"]
 
 CHUNK_SIZE = 1000  # characters
+TOKEN_CHUNK_SIZE = 254  # all-MiniLM-L6-v2 max_seq_length (256) minus [CLS]/[SEP]
+TOKENIZER_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+WORKERS = os.cpu_count() or 1
+POOL_CHUNKSIZE = 64  # documents per task sent to a worker
+MAX_IN_FLIGHT = 4096  # documents read but not yet written
 
 def clean_html(text):
     text = re.sub(r'<[^>]+>', '', text)  # remove HTML tags
     text = re.sub(r'&#xA;|&nbsp;', ' ', text)  # replace common HTML entities
     return text.strip()
 
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=0):
+    step = max(1, chunk_size - overlap)
+    return [text[i:i+chunk_size] for i in range(0, len(text), step) if i == 0 or i + overlap < len(text)]
+
+def token_spans(text, tokenizer):
+    """Character ``(start, end)`` span of every token in ``text``."""
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return encoded["offset_mapping"]
+
+def chunk_tokens(text, tokenizer, max_tokens=TOKEN_CHUNK_SIZE, overlap=0):
+    """Windows of at most ``max_tokens`` tokens, sliced from the original text."""
+    spans = token_spans(text, tokenizer)
+    if not spans:
+        return [text] if text else []
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    for i in range(0, len(spans), step):
+        window = spans[i:i + max_tokens]
+        chunks.append(text[window[0][0]:window[-1][1]])
+        if i + max_tokens >= len(spans):
+            break
+    return chunks
+
+def chunk_sentences(text, max_size, overlap=0, tokenizer=None):
+    """Pack whole sentences into chunks of at most ``max_size`` units.
+
+    Units are tokens when a tokenizer is given, else characters. Up to
+    ``overlap`` units of trailing sentences are repeated at the start of the
+    next chunk, as far as they fit within ``max_size`` next to its first
+    sentence. A single sentence longer than ``max_size`` is split with the
+    fixed-size chunker.
+    """
+    def size(s):
+        return len(token_spans(s, tokenizer)) if tokenizer else len(s)
+
+    def hard_split(s):
+        if tokenizer:
+            return chunk_tokens(s, tokenizer, max_size, overlap)
+        return chunk_text(s, max_size, overlap)
+
+    chunks, current, current_size = [], [], 0
+    for sentence in split_sentences(text):
+        n = size(sentence)
+        if n > max_size:
+            if current:
+                chunks.append(" ".join(current))
+                current, current_size = [], 0
+            chunks.extend(hard_split(sentence))
+            continue
+        if current and current_size + n + 1 > max_size:
+            chunks.append(" ".join(current))
+            carried, carried_size = [], 0
+            for prev in reversed(current):
+                prev_size = size(prev)
+                if carried_size + prev_size > overlap:
+                    break
+                carried.insert(0, prev)
+                carried_size += prev_size + 1
+            # The carry counts against the next chunk's size too
+            while carried and carried_size + n > max_size:
+                carried_size -= size(carried.pop(0)) + 1
+            current, current_size = carried, carried_size
+        current.append(sentence)
+        current_size += n + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+# === Worker side ===
+_worker_config = None
+_worker_tokenizer = None
+
+def init_worker(config):
+    """Load per-process state once (the tokenizer for token units)."""
+    global _worker_config, _worker_tokenizer
+    _worker_config = config
+    if config["unit"] == "tokens":
+        from transformers import AutoTokenizer
+        _worker_tokenizer = AutoTokenizer.from_pretrained(config["tokenizer"])
+
+def split_document(text, config, tokenizer=None):
+    if config["split"] == "sentences":
+        return chunk_sentences(text, config["size"], config["overlap"], tokenizer)
+    if config["unit"] == "tokens":
+        return chunk_tokens(text, tokenizer, config["size"], config["overlap"])
+    return chunk_text(text, config["size"], config["overlap"])
+
+def process_line(line):
+    """Clean and chunk one input document into output records.
+
+    ``line`` is a raw JSONL line, parsed here so parsing runs in the
+    workers, or an already decoded Parquet row.
+    """
+    item = json.loads(line) if isinstance(line, str) else line
+    qid = item["id"]
+    source = item.get("source") or "unknown"
+
+    text = clean_html((item.get("title") or "") + "\n\n" + (item.get("body") or ""))
+    chunked = split_document(text, _worker_config, _worker_tokenizer)
+
+    return [
+        {
+            "id": qid,
+            "chunk_id": i,
+            "chunk": c,
+            "source": source
+        }
+        for i, c in enumerate(chunked)
+    ]
+
+# === Driver side ===
+def read_lines(path, slots, stop):
+    """Stream input documents, blocking once ``MAX_IN_FLIGHT`` are unwritten.
+
+    JSONL yields raw lines. Parquet yields rows with only the columns the
+    chunker uses. Stops early once ``stop`` is set.
+    """
+    if is_parquet(path):
+        for item in iter_records(path, columns=INPUT_COLUMNS):
+            slots.acquire()
+            if stop.is_set():
+                return
+            yield item
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                slots.acquire()
+                if stop.is_set():
+                    return
+                yield line
+
+def chunk_documents(input_path, output_path, config, workers=WORKERS):
+    """Read, clean, chunk and write documents with bounded memory.
+
+    With several workers, documents are chunked in a process pool and
+    written back in input order.
+    """
+    slots = threading.Semaphore(MAX_IN_FLIGHT)
+    stop = threading.Event()
+    lines = read_lines(input_path, slots, stop)
+    n_chunks = 0
+
+    with RecordWriter(output_path) as out:
+        if workers > 1:
+            pool = Pool(workers, initializer=init_worker, initargs=(config,))
+            results = pool.imap(process_line, lines, chunksize=POOL_CHUNKSIZE)
+        else:
+            pool = None
+            init_worker(config)
+            results = map(process_line, lines)
+
+        try:
+            for chunks in tqdm(results, desc="Chunking documents", unit="doc"):
+                out.write_many(chunks)
+                n_chunks += len(chunks)
+                slots.release()
+        except BaseException:
+            if pool is not None:
+                # The pool's feeder thread may be blocked on a slot that only
+                # this loop releases: wake it so it sees ``stop`` and exits.
+                stop.set()
+                slots.release()
+                pool.terminate()
+            raise
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    return n_chunks
 
 def main():
-    input_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_INPUT_PATH
-    output_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_OUTPUT_PATH
+    parser = argparse.ArgumentParser(description="Clean and chunk raw posts.")
+    parser.add_argument("input_path", nargs="?", default=DEFAULT_INPUT_PATH)
+    parser.add_argument("output_path", nargs="?", default=DEFAULT_OUTPUT_PATH)
+    parser.add_argument("--unit", choices=("chars", "tokens"), default="chars",
+                        help="Measure chunk size in characters or MiniLM tokenizer tokens.")
+    parser.add_argument("--split", choices=("fixed", "sentences"), default="fixed",
+                        help="Cut at fixed offsets or only between sentences.")
+    parser.add_argument("--size", type=int,
+                        help=f"Max chunk size (default {CHUNK_SIZE} chars / {TOKEN_CHUNK_SIZE} tokens).")
+    parser.add_argument("--overlap", type=int, default=0, help="Overlap between consecutive chunks.")
+    parser.add_argument("--tokenizer", default=TOKENIZER_NAME)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = [json.loads(line) for line in f]
+    size = args.size or (TOKEN_CHUNK_SIZE if args.unit == "tokens" else CHUNK_SIZE)
+    if not 0 <= args.overlap < size:
+        parser.error("--overlap must be smaller than the chunk size")
+    config = {
+        "unit": args.unit,
+        "split": args.split,
+        "size": size,
+        "overlap": args.overlap,
+        "tokenizer": args.tokenizer,
+    }
 
-    chunks = []
-    for item in tqdm(data, desc="Chunking documents"):
-        qid = item["id"]
-        source = item.get("source", "unknown")
-
-        text = clean_html(item.get("title", "") + "\n\n" + item.get("body", ""))
-        chunked = chunk_text(text)
-
-        for i, c in enumerate(chunked):
-            chunks.append({
-                "id": qid,
-                "chunk_id": i,
-                "chunk": c,
-                "source": source
-            })
-
-    with open(output_path, "w", encoding="utf-8") as out:
-        for chunk in chunks:
-            out.write(json.dumps(chunk) + "\n")
-
-    print(f"✅ Saved {len(chunks)} chunks to {output_path}")
+    n_chunks = chunk_documents(args.input_path, args.output_path, config, args.workers)
+    print(f"✅ Saved {n_chunks} chunks to {args.output_path}")
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,49 @@
+import argparse
+import asyncio
 import json
 import os
-import multiprocessing
+import random
+import sys
 import time
 from pathlib import Path
 from tqdm import tqdm
-from ollama import Client
+from ollama import AsyncClient
 
-INPUT_PATH = (
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.data_preparation.columnar import count_records, input_path, iter_records
+
+INPUT_PATH = input_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/chunked_documents_train.jsonl"
 )
+# Output stays JSONL: resuming appends to it. Convert it with columnar.py afterwards.
 OUTPUT_PATH = (
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/chunked_contextual_train.jsonl"
 )
+DEAD_LETTER_PATH = (
+    Path(__file__).resolve().parent.parent.parent
+    / "data/processed/chunked_contextual_train.failed.jsonl"
+)
 MODEL_NAME = "gemma3:latest"
-NUM_WORKERS = 8
+CONCURRENCY = 8          # in-flight requests to the Ollama server
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0       # seconds; doubled on every retry, with jitter
+BACKOFF_MAX = 60.0
+FLUSH_EVERY = 50         # output lines between flushes
+REORDER_WINDOW = 4       # ordered mode: pending items per concurrency slot
+MODES = ("chunk", "document")
+KEEP_ALIVE = "30m"       # document mode: keep the model (and its prompt cache) loaded
+NUM_CTX = 8192           # document mode: the whole post plus its follow-up must fit
+MAX_DOC_CHARS = 20000    # posts longer than this are truncated in the document prompt
+CHUNK_PREFIX_CHARS = 80  # document mode: chunks the model has read are named by their opening
+MAX_FOLLOWUP_CHARS = 4000  # document mode: chunk text per follow-up; bigger posts take several
+MAX_FOLLOWUP_CHUNKS = 24   # document mode: contexts asked for per follow-up, bounding its answer
 
-client = Client()
-
-def summarize(text):
-    prompt = f"""
+def build_prompt(text):
+    return f"""
 You are a helpful assistant. Your job is to generate a search-optimized summary of a passage.
 
 Passage:
@@ -28,41 +51,305 @@ Passage:
 
 Summary (one paragraph, suitable for document search):
 """
-    response = client.chat(model=MODEL_NAME, messages=[
-        {"role": "user", "content": prompt.strip()}
+
+def build_document_prompt(document):
+    return f"""
+<document>
+{document.strip()}
+</document>
+
+You are a helpful assistant. In two or three sentences, state what this document is about: its subject, the problem it discusses and its key terms.
+"""
+
+def chunk_reference(chunk, seen):
+    """How a follow-up names a chunk: its opening words if the model read it
+    in the document, else (past the truncation) its full text."""
+    text = chunk.strip()
+    if seen:
+        return f'the passage starting "{text[:CHUNK_PREFIX_CHARS]}"'
+    return f"this passage:\n{text}"
+
+def build_chunk_contexts_prompt(refs):
+    numbered = "\n".join(f"<chunk {i}> {ref}" for i, ref in enumerate(refs))
+    return f"""
+Here are {len(refs)} chunks the document above was split into:
+
+{numbered}
+
+For each chunk, give a short succinct context (one sentence) that situates it within the overall document, for the purposes of improving search retrieval of the chunk.
+Answer with JSON only: {{"contexts": ["context for chunk 0", "context for chunk 1", ...]}} with exactly {len(refs)} strings.
+"""
+
+def build_chunk_context_prompt(ref):
+    return f"""
+Here is a chunk of the document above: {ref}
+
+Give a short succinct context to situate this chunk within the overall document for the purposes of improving search retrieval of the chunk. Answer only with the succinct context and nothing else.
+"""
+
+class Usage:
+    """LLM calls and token counts of one run, as reported by Ollama."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, response):
+        self.calls += 1
+        self.prompt_tokens += response.get('prompt_eval_count') or 0
+        self.output_tokens += response.get('eval_count') or 0
+
+    def __str__(self):
+        return (f"{self.calls} LLM calls, {self.prompt_tokens} prompt tokens evaluated, "
+                f"{self.output_tokens} generated")
+
+async def summarize(client, text, usage):
+    response = await client.chat(model=MODEL_NAME, messages=[
+        {"role": "user", "content": build_prompt(text).strip()}
     ])
+    usage.add(response)
     return response['message']['content'].strip()
 
-def process_chunk(line):
+async def generate(client, prompt, usage, context=None, format=None):
+    """One ``/api/generate`` call; returns ``(text, context)``.
+
+    Passing the previous call's ``context`` continues that conversation,
+    and with the model kept alive Ollama reuses the cached KV state for
+    the shared prefix instead of re-evaluating the document.
+    """
+    response = await client.generate(model=MODEL_NAME, prompt=prompt.strip(), context=context,
+                                      format=format, keep_alive=KEEP_ALIVE, options={"num_ctx": NUM_CTX})
+    usage.add(response)
+    return response['response'].strip(), response.get('context')
+
+def parse_contexts(text, n):
+    """The ``contexts`` list from the model's JSON answer, or None if unusable."""
     try:
-        item = json.loads(line)
-        summary = summarize(item["chunk"])
-        item["chunk"] = summary
-        return json.dumps(item)
-    except Exception:
+        contexts = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(contexts, dict):
+        contexts = contexts.get("contexts")
+    if not isinstance(contexts, list) or len(contexts) != n:
+        return None
+    if not all(isinstance(c, str) and c.strip() for c in contexts):
         return None
+    return [c.strip() for c in contexts]
+
+def document_text(post):
+    """The post as sent in the document prompt, and the keys of the chunks it fully contains."""
+    document = "\n\n".join(item["chunk"] for item in post)[:MAX_DOC_CHARS]
+    seen, offset = set(), 0
+    for item in post:
+        offset += len(item["chunk"])
+        if offset <= MAX_DOC_CHARS:
+            seen.add(chunk_key(item))
+        offset += 2
+    return document, seen
+
+def followup_batches(refs):
+    """Index lists small enough for one follow-up to fit beside the document in ``NUM_CTX``."""
+    batch, size = [], 0
+    for i, ref in enumerate(refs):
+        if batch and (size + len(ref) > MAX_FOLLOWUP_CHARS or len(batch) == MAX_FOLLOWUP_CHUNKS):
+            yield batch
+            batch, size = [], 0
+        batch.append(i)
+        size += len(ref)
+    if batch:
+        yield batch
+
+async def contextualize_document(client, post, items, usage):
+    """Prepend a situating context to each of ``items``, chunks of ``post``.
+
+    The whole post is read once to produce a document-level context.
+    Follow-ups on the same conversation then ask for a JSON list with one
+    context per chunk, naming each chunk by its opening words rather than
+    sending its text again. Only if an answer is malformed does each of its
+    chunks get its own follow-up, still on the cached document.
+    """
+    document, seen = document_text(post)
+    doc_context, context = await generate(client, build_document_prompt(document), usage)
+    refs = [chunk_reference(item["chunk"], chunk_key(item) in seen) for item in items]
+    contexts = []
+    for batch in followup_batches(refs):
+        batch_refs = [refs[i] for i in batch]
+        answer, _ = await generate(client, build_chunk_contexts_prompt(batch_refs), usage, context, format="json")
+        parsed = parse_contexts(answer, len(batch))
+        if parsed is None:
+            parsed = [(await generate(client, build_chunk_context_prompt(ref), usage, context))[0]
+                      for ref in batch_refs]
+        contexts.extend(parsed)
+    return [{**item, "chunk": f"{ctx}\n\n{item['chunk']}", "context": ctx, "doc_context": doc_context}
+            for item, ctx in zip(items, contexts)]
+
+async def with_retries(fn, max_retries):
+    """Await ``fn()``, retrying with exponential backoff; returns ``(result, error)``."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await fn(), None
+        except Exception as e:
+            if attempt == max_retries:
+                return None, f"{type(e).__name__}: {e}"
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(delay)
+
+async def process_chunk(client, item, usage, max_retries=MAX_RETRIES):
+    """Summarize one chunk, retrying with exponential backoff.
+
+    Returns ``[(item, None)]`` on success or ``[(item, error)]`` once
+    retries are exhausted.
+    """
+    async def run():
+        return {**item, "chunk": await summarize(client, item["chunk"], usage)}
+    result, error = await with_retries(run, max_retries)
+    return [(item, error) if error else (result, None)]
+
+async def process_document(client, job, usage, max_retries=MAX_RETRIES):
+    """Contextualize one post's pending chunks; a failure dead-letters all of them."""
+    post, items = job
+    results, error = await with_retries(lambda: contextualize_document(client, post, items, usage), max_retries)
+    if error:
+        return [(item, error) for item in items]
+    return [(result, None) for result in results]
+
+def chunk_key(item):
+    return (item["id"], item.get("chunk_id", 0))
 
 def already_processed_chunks(output_file: Path):
     if not output_file.exists():
         return set()
-    with open(output_file, "r", encoding="utf-8") as f:
-        return set((json.loads(line)["id"], json.loads(line).get("chunk_id", 0)) for line in f)
+    return {chunk_key(item) for item in iter_records(output_file, columns=["id", "chunk_id"])}
 
-def main():
-    processed_chunks = already_processed_chunks(OUTPUT_PATH)
+class OutputWriter:
+    """Writes results as they finish, or in input order with a reorder buffer."""
+
+    def __init__(self, out, dead_letter, ordered, progress):
+        self.out = out
+        self.dead_letter = dead_letter
+        self.ordered = ordered
+        self.progress = progress
+        self.pending = {}
+        self.next_seq = 0
+        self.written = 0
+        self.failed = 0
+
+    def _write(self, item, error):
+        if error is None:
+            self.out.write(json.dumps(item) + "\n")
+            self.written += 1
+        else:
+            self.dead_letter.write(json.dumps({"id": item["id"], "chunk_id": item.get("chunk_id", 0),
+                                               "error": error, "item": item}) + "\n")
+            self.dead_letter.flush()
+            self.failed += 1
+        self.progress.update(1)
+        self.progress.set_postfix(ok=self.written, failed=self.failed)
+        if self.written % FLUSH_EVERY == 0:
+            self.out.flush()
 
-    with open(INPUT_PATH, "r", encoding="utf-8") as infile:
-        lines = [
-            line for line in infile
-            if (json.loads(line)["id"], json.loads(line).get("chunk_id", 0)) not in processed_chunks
-        ]
+    def submit(self, seq, results):
+        """Record one job's ``(item, error)`` results; returns how many jobs were written."""
+        if not self.ordered:
+            for item, error in results:
+                self._write(item, error)
+            return 1
+        self.pending[seq] = results
+        released = 0
+        while self.next_seq in self.pending:
+            for item, error in self.pending.pop(self.next_seq):
+                self._write(item, error)
+            self.next_seq += 1
+            released += 1
+        return released
 
-    print(f"🚀 Generating summaries for {len(lines)} chunks with {NUM_WORKERS} workers...")
+def read_jobs(input_path, processed_chunks, mode):
+    """Unprocessed input, one chunk per job or one post per job.
+
+    Document mode groups consecutive rows with the same ``id`` (the
+    chunker writes a post's chunks together) and yields ``(post, pending)``:
+    every chunk of the post for the document prompt, and those still to do.
+    """
+    def pending(post):
+        return [item for item in post if chunk_key(item) not in processed_chunks]
+
+    post = []
+    for item in iter_records(input_path):
+        if mode == "chunk":
+            if chunk_key(item) not in processed_chunks:
+                yield item
+            continue
+        if post and post[0]["id"] != item["id"]:
+            if todo := pending(post):
+                yield post, todo
+            post = []
+        post.append(item)
+    if post and (todo := pending(post)):
+        yield post, todo
+
+async def run_pipeline(input_path, output_path, dead_letter_path, concurrency=CONCURRENCY,
+                       ordered=False, max_retries=MAX_RETRIES, mode="chunk"):
+    """Contextualize every unprocessed chunk; returns ``(written, failed, usage)`` for this run."""
+    processed_chunks = already_processed_chunks(output_path)
+    total = count_records(input_path)
+    client = AsyncClient()
+    usage = Usage()
+    process = process_document if mode == "document" else process_chunk
+
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    # Caps jobs read but not yet written, so memory stays constant even
+    # when ordered output waits on a slow or retrying job.
+    window = asyncio.Semaphore(concurrency * REORDER_WINDOW)
+
+    action = "contexts per post" if mode == "document" else "summaries"
+    print(f"🚀 Generating {action} for {total - len(processed_chunks)} of {total} chunks "
+          f"with {concurrency} concurrent requests...")
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+         open(dead_letter_path, "a", encoding="utf-8") as dead_letter, \
+         tqdm(total=total, initial=len(processed_chunks), desc="⏱️ Chunking",
+              unit="chunk", dynamic_ncols=True) as progress:
+        writer = OutputWriter(out, dead_letter, ordered, progress)
+
+        async def produce():
+            for seq, job in enumerate(read_jobs(input_path, processed_chunks, mode)):
+                await window.acquire()
+                await queue.put((seq, job))
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def work():
+            while (job := await queue.get()) is not None:
+                seq, payload = job
+                results = await process(client, payload, usage, max_retries)
+                for _ in range(writer.submit(seq, results)):
+                    window.release()
+
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+
+    print(f"📄 Wrote {writer.written} chunks to {output_path}")
+    if writer.failed:
+        print(f"⚠️ {writer.failed} failures in {dead_letter_path}")
+    print(f"🔢 {usage}")
+    return writer.written, writer.failed, usage
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate contextual summaries for chunks.")
+    parser.add_argument("--input", type=Path, default=INPUT_PATH)
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH)
+    parser.add_argument("--dead-letter", type=Path, default=DEAD_LETTER_PATH)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--ordered", action="store_true",
+                        help="Write results in input order instead of completion order.")
+    parser.add_argument("--mode", choices=MODES, default="chunk",
+                        help="chunk: replace each chunk with its own summary. document: read each post "
+                             "once and prepend a situating context to each of its chunks.")
+    args = parser.parse_args()
 
-    with multiprocessing.Pool(NUM_WORKERS) as pool, open(OUTPUT_PATH, "a", encoding="utf-8") as out:
-        for result in tqdm(pool.imap(process_chunk, lines), total=len(lines), desc="⏱️ Chunking", dynamic_ncols=True):
-            if result:
-                out.write(result + "\n")
+    asyncio.run(run_pipeline(args.input, args.output, args.dead_letter, args.concurrency,
+                             args.ordered, args.max_retries, args.mode))
 
 if __name__ == "__main__":
     start = time.time()
@@ -0,0 +1,245 @@
+# src/data_preparation/columnar.py
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+# Format of intermediate files written by the pipeline stages: "jsonl" or "parquet"
+DATA_FORMAT = os.environ.get("DATA_FORMAT", "jsonl")
+SUFFIXES = {"jsonl": ".jsonl", "parquet": ".parquet"}
+BATCH_SIZE = 8192        # rows per record batch read or written
+ROW_GROUP_SIZE = 65536   # rows per Parquet row group
+
+
+def is_parquet(path):
+    return Path(path).suffix == ".parquet"
+
+
+def output_path(path, data_format=None):
+    """``path`` with the suffix of ``DATA_FORMAT``."""
+    return Path(path).with_suffix(SUFFIXES[data_format or DATA_FORMAT])
+
+
+def input_path(path):
+    """``path`` in whichever format exists, preferring ``DATA_FORMAT``.
+
+    Lets a stage read the previous stage's output whether or not that
+    stage ran with the same format.
+    """
+    path = Path(path)
+    candidates = [output_path(path), path] + [path.with_suffix(s) for s in SUFFIXES.values()]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return path
+
+
+# === Reading ===
+def _parquet_batches(path, columns, batch_size):
+    import pyarrow.parquet as pq
+
+    f = pq.ParquetFile(path)
+    names = f.schema_arrow.names
+    wanted = None if columns is None else [c for c in columns if c in names]
+    missing = [] if columns is None else [c for c in columns if c not in names]
+    for batch in f.iter_batches(batch_size=batch_size, columns=wanted):
+        rows = batch.to_pylist()
+        for row in rows:
+            for c in missing:
+                row[c] = None
+        yield rows
+
+
+def _jsonl_batches(path, columns, batch_size):
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            rows.append(item if columns is None else {c: item.get(c) for c in columns})
+            if len(rows) >= batch_size:
+                yield rows
+                rows = []
+    if rows:
+        yield rows
+
+
+def iter_batches(path, columns=None, batch_size=BATCH_SIZE):
+    """Stream lists of row dicts, at most ``batch_size`` rows each.
+
+    ``columns`` projects the rows. For Parquet, only those column chunks
+    are read and decoded; JSONL lines still have to be parsed whole.
+    Projected columns the file lacks come back as None.
+    """
+    if is_parquet(path):
+        return _parquet_batches(path, columns, batch_size)
+    return _jsonl_batches(path, columns, batch_size)
+
+
+def iter_records(path, columns=None, batch_size=BATCH_SIZE):
+    """One row dict at a time; see ``iter_batches``."""
+    for rows in iter_batches(path, columns, batch_size):
+        yield from rows
+
+
+def count_records(path):
+    """Row count; read from the Parquet footer without touching the data."""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+# === Writing ===
+def _conform(table, schema):
+    """``table`` (or record batch) with ``schema``'s columns, order and types."""
+    import pyarrow as pa
+
+    columns = [table.column(f.name).cast(f.type) if f.name in table.schema.names
+               else pa.nulls(table.num_rows, f.type) for f in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class RecordWriter:
+    """Write row dicts to JSONL or Parquet, chosen by the path's suffix.
+
+    Parquet rows are buffered into record batches of ``batch_size``. The
+    schema is the union of every batch's columns: when a batch brings a new
+    column, or values that widen a type (a column that was all null, ints
+    next to floats), the row groups written so far are rewritten under the
+    unified schema. Types that cannot be reconciled raise ``ValueError``
+    rather than being dropped or coerced. Use as a context manager, or
+    call ``close()``; a Parquet file is only valid once closed.
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, mode="w"):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.count = 0
+        self._parquet = is_parquet(path)
+        self._rows = []
+        self._writer = None
+        if self._parquet:
+            if mode != "w":
+                raise ValueError("Parquet files cannot be appended to; write a new file")
+            self._file = None
+        else:
+            self._file = open(path, mode, encoding="utf-8")
+
+    def write(self, record):
+        self.count += 1
+        if not self._parquet:
+            self._file.write(json.dumps(record) + "\n")
+            return
+        self._rows.append(record)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def _batch_table(self):
+        import pyarrow as pa
+
+        # from_pylist takes its columns from the first row only
+        names = list(dict.fromkeys(k for row in self._rows for k in row))
+        try:
+            return pa.Table.from_pydict({n: [row.get(n) for row in self._rows] for n in names})
+        except (pa.ArrowTypeError, pa.ArrowInvalid) as e:
+            raise ValueError(f"{self.path}: mixed value types in rows "
+                             f"{self.count - len(self._rows) + 1}-{self.count}: {e}") from e
+
+    def _unify(self, schema):
+        import pyarrow as pa
+
+        try:
+            return pa.unify_schemas([self._writer.schema, schema], promote_options="permissive")
+        except (pa.ArrowTypeError, pa.ArrowInvalid) as e:
+            raise ValueError(f"{self.path}: rows {self.count - len(self._rows) + 1}-{self.count} "
+                             f"do not fit the columns written so far: {e}") from e
+
+    def _migrate(self, schema):
+        """Rewrite the row groups already written under the widened ``schema``."""
+        import pyarrow.parquet as pq
+
+        self._writer.close()
+        old = self.path.with_name(self.path.name + ".migrating")
+        os.replace(self.path, old)
+        self._writer = pq.ParquetWriter(self.path, schema)
+        for batch in pq.ParquetFile(old).iter_batches(batch_size=self.batch_size):
+            self._write_table(_conform(batch, schema))
+        old.unlink()
+
+    def _write_table(self, table):
+        self._writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+
+    def _flush(self):
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        table = self._batch_table()
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        elif not table.schema.equals(self._writer.schema):
+            schema = self._unify(table.schema)
+            if not schema.equals(self._writer.schema):
+                self._migrate(schema)
+        self._write_table(_conform(table, self._writer.schema))
+        self._rows = []
+
+    def flush(self):
+        if self._parquet:
+            self._flush()
+        else:
+            self._file.flush()
+
+    def close(self):
+        if self._parquet:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+            else:  # no rows: still leave a readable (empty) file behind
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                pq.write_table(pa.table({}), self.path)
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self._rows = []  # don't re-raise a bad batch while closing
+        self.close()
+
+
+def write_records(path, records, batch_size=BATCH_SIZE):
+    """Write an iterable of row dicts; returns how many were written."""
+    with RecordWriter(path, batch_size) as writer:
+        writer.write_many(records)
+    return writer.count
+
+
+def convert(src, dst, columns=None, batch_size=BATCH_SIZE):
+    """Copy ``src`` to ``dst``; each side's format follows its suffix."""
+    return write_records(dst, iter_records(src, columns, batch_size), batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pipeline files between JSONL and Parquet.")
+    parser.add_argument("src", type=Path)
+    parser.add_argument("dst", type=Path)
+    parser.add_argument("--columns", nargs="+", help="Only copy these columns.")
+    args = parser.parse_args()
+    n = convert(args.src, args.dst, args.columns)
+    print(f"✅ Wrote {n} records to {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
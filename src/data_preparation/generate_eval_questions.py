@@ -1,8 +1,15 @@
 import json
+import os
+import sys
 from collections import defaultdict
 from pathlib import Path
 
-EVAL_CHUNKED = (
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.data_preparation.columnar import input_path, iter_records
+
+EVAL_CHUNKED = input_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/chunked_documents_eval.jsonl"
 )
@@ -11,23 +18,31 @@ EVAL_OUTPUT = (
     / "data/processed/eval_questions.jsonl"
 )
 
-# Group chunks by question ID
-by_question = defaultdict(list)
-
-with open(EVAL_CHUNKED, "r", encoding="utf-8") as f:
-    for line in f:
-        item = json.loads(line)
-        by_question[item["id"]].append(item)
-
-# Save one eval question per post
-with open(EVAL_OUTPUT, "w", encoding="utf-8") as out:
-    for qid, chunks in by_question.items():
-        question = chunks[0]["chunk"].split('\n')[-1][:300]
-        entry = {
-            "question": question,
-            "id": qid,
-            "relevant_chunk_ids": [c["chunk_id"] for c in chunks]
-        }
-        out.write(json.dumps(entry) + "\n")
-
-print(f"✅ Created {len(by_question)} entries in eval_questions.jsonl")
+def generate_eval_questions(eval_chunked=EVAL_CHUNKED, eval_output=EVAL_OUTPUT):
+    """Write one eval question per post; returns how many."""
+    # Group chunks by question ID; only the first chunk's text is kept
+    by_question = defaultdict(list)
+    first_chunk = {}
+
+    for item in iter_records(eval_chunked, columns=["id", "chunk_id", "chunk"]):
+        by_question[item["id"]].append(item["chunk_id"])
+        first_chunk.setdefault(item["id"], item["chunk"])
+
+    # Save one eval question per post
+    with open(eval_output, "w", encoding="utf-8") as out:
+        for qid, chunk_ids in by_question.items():
+            question = first_chunk[qid].split('\n')[-1][:300]
+            entry = {
+                "question": question,
+                "id": qid,
+                "relevant_chunk_ids": chunk_ids
+            }
+            out.write(json.dumps(entry) + "\n")
+    return len(by_question)
+
+def main():
+    n = generate_eval_questions()
+    print(f"✅ Created {n} entries in eval_questions.jsonl")
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,45 @@
-import json
-import random
+import argparse
+import os
+import sys
 from pathlib import Path
 
-INPUT = (
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.data_preparation.columnar import RecordWriter, input_path, iter_records, output_path
+from src.data_preparation.splitting import EVAL_RATIO, SPLIT_SALT, is_eval
+
+INPUT = input_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/combined.jsonl"
 )
-TRAIN_OUT = (
+TRAIN_OUT = output_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/train_questions.jsonl"
 )
-EVAL_OUT = (
+EVAL_OUT = output_path(
     Path(__file__).resolve().parent.parent.parent
     / "data/processed/eval_questions_raw.jsonl"
 )
 
-random.seed(42)
-
-with open(INPUT, "r", encoding="utf-8") as f:
-    data = [json.loads(line) for line in f]
-
-random.shuffle(data)
-split_idx = int(0.9 * len(data))
-train, eval = data[:split_idx], data[split_idx:]
+def split_posts(input_file=INPUT, train_out=TRAIN_OUT, eval_out=EVAL_OUT, ratio=EVAL_RATIO, salt=SPLIT_SALT):
+    """Route each post to train or eval by a hash of its ID, in one streaming pass."""
+    with RecordWriter(train_out) as train_f, RecordWriter(eval_out) as eval_f:
+        for item in iter_records(input_file):
+            (eval_f if is_eval(item["id"], ratio, salt) else train_f).write(item)
+    return train_f.count, eval_f.count
 
-with open(TRAIN_OUT, "w", encoding="utf-8") as f:
-    for item in train:
-        f.write(json.dumps(item) + "\n")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split raw posts into train and eval sets.")
+    parser.add_argument("--input", type=Path, default=INPUT)
+    parser.add_argument("--train-out", type=Path, default=TRAIN_OUT)
+    parser.add_argument("--eval-out", type=Path, default=EVAL_OUT)
+    parser.add_argument("--ratio", type=float, default=EVAL_RATIO, help="Share of posts held out for eval.")
+    parser.add_argument("--salt", default=SPLIT_SALT)
+    args = parser.parse_args(argv)
 
-with open(EVAL_OUT, "w", encoding="utf-8") as f:
-    for item in eval:
-        f.write(json.dumps(item) + "\n")
+    n_train, n_eval = split_posts(args.input, args.train_out, args.eval_out, args.ratio, args.salt)
+    print(f"✅ Wrote {n_train} train and {n_eval} eval posts.")
 
-print(f"✅ Wrote {len(train)} train and {len(eval)} eval posts.")
+if __name__ == "__main__":
+    main()
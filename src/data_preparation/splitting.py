@@ -0,0 +1,22 @@
+# src/data_preparation/splitting.py
+
+import hashlib
+
+EVAL_RATIO = 0.1        # share of posts held out for evaluation
+SPLIT_SALT = "eval-v1"  # change to draw a different, equally deterministic split
+
+
+def split_bucket(key, salt=SPLIT_SALT):
+    """Stable position of ``key`` in ``[0, 1)``, independent of row order and process."""
+    digest = hashlib.blake2b(f"{salt}:{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def is_eval(key, ratio=EVAL_RATIO, salt=SPLIT_SALT):
+    """Whether post ``key`` belongs to the eval split.
+
+    Deciding per key means a split is one streaming pass with no shuffle
+    buffer, every chunk of a post lands on the same side, and a post keeps
+    its side when others are added or removed.
+    """
+    return split_bucket(key, salt) < ratio
@@ -0,0 +1,87 @@
+# src/evaluation/answer_metrics.py
+
+import numpy as np
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def cosine_scores(gold_vec, chunk_vecs):
+    """Cosine similarity of one gold embedding against each chunk vector."""
+    return normalize_rows(chunk_vecs) @ normalize_rows(gold_vec).reshape(-1)
+
+
+def keyword_scores(gold_answer, chunks):
+    """Whitespace-token Jaccard of ``gold_answer`` against every chunk.
+
+    Tokens are mapped to one shared vocabulary and compared as a boolean
+    ``(n_chunks, vocab)`` matrix, so the whole retrieved set is scored with
+    one matrix-vector product.
+    """
+    gold_tokens = set(gold_answer.lower().split())
+    chunk_tokens = [set(c.lower().split()) for c in chunks]
+    vocab = {t: i for i, t in enumerate(gold_tokens.union(*chunk_tokens))}
+    if not vocab:
+        return np.zeros(len(chunks))
+
+    gold = np.zeros(len(vocab), dtype=np.float32)
+    gold[[vocab[t] for t in gold_tokens]] = 1.0
+    matrix = np.zeros((len(chunks), len(vocab)), dtype=np.float32)
+    for row, tokens in enumerate(chunk_tokens):
+        matrix[row, [vocab[t] for t in tokens]] = 1.0
+
+    inter = matrix @ gold
+    union = matrix.sum(axis=1) + gold.sum() - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def cosine_score_matrix(gold_vecs, chunk_vecs):
+    """Row-wise cosine: ``(n, d)`` gold vectors against ``(n, k, d)`` chunk vectors -> ``(n, k)``."""
+    return np.einsum("nkd,nd->nk", normalize_rows(chunk_vecs), normalize_rows(gold_vecs))
+
+
+def keyword_score_matrix(gold_answers, chunk_rows):
+    """``keyword_scores`` for many questions at once -> ``(n, k)``.
+
+    ``chunk_rows[q]`` holds the ``k`` texts scored against
+    ``gold_answers[q]``. Every text becomes a set of token IDs in one shared
+    vocabulary; intersections are counted by matching ``(question, token)``
+    keys of the chunks against those of the golds, so the whole eval set is
+    scored with a handful of array operations instead of a loop of small
+    matrices.
+    """
+    n = len(gold_answers)
+    k = max((len(row) for row in chunk_rows), default=0)
+    vocab = {}
+
+    def token_ids(text):
+        return np.unique(np.fromiter((vocab.setdefault(t, len(vocab)) for t in text.lower().split()),
+                                     dtype=np.int64))
+
+    gold_ids = [token_ids(g) for g in gold_answers]
+    chunk_ids = [[token_ids(c) for c in row] for row in chunk_rows]
+    if n == 0 or k == 0:
+        return np.zeros((n, k))
+    v = max(len(vocab), 1)
+
+    gold_len = np.array([len(ids) for ids in gold_ids], dtype=np.float64)
+    gold_keys = np.concatenate([q * v + ids for q, ids in enumerate(gold_ids)] + [np.empty(0, np.int64)])
+
+    chunk_len = np.zeros(n * k)
+    slots, keys = [], []
+    for q, row in enumerate(chunk_ids):
+        for j, ids in enumerate(row):
+            chunk_len[q * k + j] = len(ids)
+            slots.append(np.full(len(ids), q * k + j, dtype=np.int64))
+            keys.append(q * v + ids)
+    slots = np.concatenate(slots + [np.empty(0, np.int64)])
+    keys = np.concatenate(keys + [np.empty(0, np.int64)])
+
+    inter = np.bincount(slots[np.isin(keys, gold_keys)], minlength=n * k).astype(np.float64)
+    union = chunk_len + np.repeat(gold_len, k) - inter
+    scores = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+    return scores.reshape(n, k)
@@ -0,0 +1,91 @@
+# src/evaluation/compression_report.py
+
+import argparse
+import json
+import os
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.evaluation.evaluator import (
+    EVAL_PATH, MODEL_NAME, RAG_DOCS_PATH, RAG_INDEX_PATH, TOP_K,
+    encode_queries, evaluate_index, load_jsonl,
+)
+from src.evaluation.index_sweep import index_size_bytes
+from src.retrieval import index_factory
+
+# (label, normalize, vector_dtype); the first row is the baseline
+VARIANTS = [
+    ("float32 L2", False, "float32"),
+    ("float32 cosine", True, "float32"),
+    ("fp16 cosine", True, "fp16"),
+    ("int8 cosine", True, "int8"),
+]
+
+
+def run_report(xb, docs, eval_data, query_vecs, index_type="flat", k=TOP_K, variants=VARIANTS):
+    """Index size and retrieval metrics for each storage variant."""
+    rows = []
+    for label, normalize, vector_dtype in variants:
+        print(f"Building {index_type} {label}...")
+        index = index_factory.build_index(xb, index_type, normalize=normalize, vector_dtype=vector_dtype)
+        metrics, _ = evaluate_index(index, docs, eval_data, query_vecs, k)
+        rows.append({
+            "variant": label,
+            "index_type": index_type,
+            "normalize": normalize,
+            "vector_dtype": vector_dtype,
+            "size_mb": index_size_bytes(index) / 2**20,
+            "recall_at_1": metrics["recall_at_1"],
+            f"recall_at_{k}": metrics["recall_at_k"],
+            "mrr": metrics["mrr"],
+        })
+
+    base = rows[0]
+    for row in rows:
+        row["memory_saved"] = 1 - row["size_mb"] / base["size_mb"]
+        row[f"delta_recall_at_{k}"] = row[f"recall_at_{k}"] - base[f"recall_at_{k}"]
+        row["delta_mrr"] = row["mrr"] - base["mrr"]
+    return rows
+
+
+def print_table(rows, k):
+    print(f"\n{'variant':<16} {'size MB':>9} {'saved':>7} {'R@1':>7} {'R@' + str(k):>7} "
+          f"{'ΔR@' + str(k):>8} {'MRR':>7} {'ΔMRR':>8}")
+    for r in rows:
+        print(f"{r['variant']:<16} {r['size_mb']:>9.1f} {r['memory_saved']:>7.1%} {r['recall_at_1']:>7.4f} "
+              f"{r[f'recall_at_{k}']:>7.4f} {r[f'delta_recall_at_{k}']:>+8.4f} "
+              f"{r['mrr']:>7.4f} {r['delta_mrr']:>+8.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory saved vs. Recall@k/MRR change for compressed vector storage.")
+    parser.add_argument("--index", default=RAG_INDEX_PATH, help="Index whose corpus vectors are re-encoded.")
+    parser.add_argument("--docs", default=RAG_DOCS_PATH)
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--index-type", choices=index_factory.INDEX_TYPES, default="flat")
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    from src.retrieval.embedding_backend import load_encoder
+    from src.retrieval.doc_store import load_docs
+
+    print(f"Loading corpus vectors for {args.index}...")
+    xb = index_factory.load_corpus_vectors(args.index)
+    docs = load_docs(args.docs)
+    eval_data = load_jsonl(args.eval)
+    query_vecs = encode_queries(load_encoder(MODEL_NAME), [ex["question"] for ex in eval_data])
+
+    rows = run_report(xb, docs, eval_data, query_vecs, args.index_type, args.k)
+    print_table(rows, args.k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📄 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# src/evaluation/eval_answers.py
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.evaluation.answer_metrics import cosine_score_matrix, keyword_score_matrix
+from src.evaluation.evaluator import (
+    CTX_DOCS_PATH, CTX_INDEX_PATH, EVAL_PATH, MODEL_NAME, RAG_DOCS_PATH, RAG_INDEX_PATH, TOP_K,
+    encode_queries, load_jsonl, search_all,
+)
+from src.data_preparation.generate_eval_questions import EVAL_CHUNKED
+from src.generation.scheduler import MAX_CONCURRENT
+
+TARGETS = {
+    "rag": (RAG_INDEX_PATH, RAG_DOCS_PATH),
+    "contextual": (CTX_INDEX_PATH, CTX_DOCS_PATH),
+}
+CHECKPOINT_PATH = "data/processed/answer_eval.jsonl"
+GOLD_LOG_PATH = "evaluation_logs.jsonl"
+OLLAMA_MODEL = "gemma3:latest"
+SIM_THRESHOLD = 0.7       # same thresholds as the app's online eval
+KEYWORD_THRESHOLD = 0.5
+ENCODE_BATCH_SIZE = 256
+
+
+def question_key(ex):
+    return str(ex["id"])
+
+
+def run_key(index_path, docs_path, k, ollama_model):
+    """What an answer depends on besides its question.
+
+    Covers the retrieval depth, the generator and encoder, and the size and
+    mtime of the index and doc store, so rebuilding an index invalidates
+    its checkpointed answers.
+    """
+    from src.retrieval.embedding_backend import encoder_id
+    from src.retrieval.sharding import manifest_path
+
+    if manifest_path(index_path).exists():
+        index_path = manifest_path(index_path)
+    files = [[str(p), os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in (index_path, docs_path)]
+    payload = json.dumps([files, k, ollama_model, encoder_id(MODEL_NAME)])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+# === Checkpoint ===
+def load_checkpoint(path, runs):
+    """Completed results keyed by ``(target, question key)``.
+
+    ``runs`` maps each target to its current ``run_key``; failed results and
+    ones from another run (older index, other ``k`` or model) are redone.
+    """
+    done = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if "error" not in record and record.get("run") == runs.get(record["target"]):
+                    done[(record["target"], record["key"])] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class CheckpointWriter:
+    """Appends one JSON line per finished question, flushed immediately."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# === Generation ===
+def retrieve_pending(model, eval_data, pending, targets, k):
+    """Row IDs per pending ``(target, question index)``.
+
+    Each pending question is encoded once and every target is searched
+    with one matrix query.
+    """
+    from src.retrieval.index_factory import load_index
+
+    questions = sorted({q for _, q in pending})
+    if not questions:
+        return {}
+    print(f"Encoding {len(questions)} pending questions...")
+    query_vecs = encode_queries(model, [eval_data[q]["question"] for q in questions])
+    row_of = {q: i for i, q in enumerate(questions)}
+
+    retrieved = {}
+    for name in sorted({t for t, _ in pending}):
+        index = load_index(targets[name][0])
+        indices = search_all(index, query_vecs, k)
+        for target, q in pending:
+            if target == name:
+                retrieved[(name, q)] = [int(i) for i in indices[row_of[q]] if i >= 0]
+    return retrieved
+
+
+def generate_one(target, run, ex, ids, docs, ollama_model):
+    from src.generation.generate_answers import generate_answer
+
+    record = {"target": target, "run": run, "key": question_key(ex), "question": ex["question"], "ids": ids}
+    start = time.perf_counter()
+    try:
+        record["answer"] = generate_answer(ex["question"], [docs[i] for i in ids], model=ollama_model)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_generation(eval_data, targets, runs, checkpoint_path, k, concurrency, ollama_model, model):
+    """Generate every missing answer; returns the completed results."""
+    from src.retrieval.doc_store import load_docs
+
+    done = load_checkpoint(checkpoint_path, runs)
+    pending = [(name, q) for name in targets for q, ex in enumerate(eval_data)
+               if (name, question_key(ex)) not in done]
+    total = len(targets) * len(eval_data)
+    print(f"📋 {total - len(pending)}/{total} answers already in {checkpoint_path}; {len(pending)} to generate")
+    if not pending:
+        return done
+
+    retrieved = retrieve_pending(model, eval_data, pending, targets, k)
+    docs = {name: load_docs(targets[name][1]) for name in sorted({t for t, _ in pending})}
+
+    writer = CheckpointWriter(checkpoint_path)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eval-gen")
+    failed = 0
+    start = time.perf_counter()
+    try:
+        futures = [executor.submit(generate_one, name, runs[name], eval_data[q], retrieved[(name, q)],
+                                   docs[name], ollama_model)
+                   for name, q in pending]
+        for n, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            writer.write(record)
+            if "error" in record:
+                failed += 1
+            else:
+                done[(record["target"], record["key"])] = record
+            if n % 25 == 0 or n == len(futures):
+                rate = n / (time.perf_counter() - start)
+                print(f"  {n}/{len(futures)} answers ({rate:.2f}/s, {failed} failed)")
+    except KeyboardInterrupt:
+        print("\n⏸️ Interrupted; finished answers are checkpointed. Re-run to resume.")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        writer.close()
+    if failed:
+        print(f"⚠️ {failed} generations failed; they are retried on the next run.")
+    return done
+
+
+# === Scoring ===
+def load_gold_answers(path):
+    """Gold answers from the app's eval logs, keyed by question text."""
+    answers = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if "gold_answer" in entry:
+                    answers[entry["query"]] = entry["gold_answer"]
+    except FileNotFoundError:
+        pass
+    return answers
+
+
+def resolve_golds(eval_data, logged, eval_chunks_path=EVAL_CHUNKED):
+    """Reference text per question and where it came from.
+
+    An explicit ``gold_answer`` wins, then the app's eval logs; otherwise
+    the question's relevant chunks stand in as the reference. Those are read
+    from the eval chunk file: eval posts are held out of the indexes.
+    """
+    from src.data_preparation.columnar import iter_records
+    from src.generation.context_packer import clean_html
+
+    wanted = {(ex["id"], cid) for ex in eval_data for cid in ex["relevant_chunk_ids"]}
+    chunk_text = {}
+    if any(not ex.get("gold_answer") and ex["question"] not in logged for ex in eval_data):
+        for item in iter_records(eval_chunks_path, columns=["id", "chunk_id", "chunk"]):
+            key = (item["id"], item["chunk_id"] or 0)
+            if key in wanted:
+                chunk_text[key] = clean_html(item["chunk"])
+        missing = len(wanted - chunk_text.keys())
+        if missing:
+            print(f"⚠️ {missing} relevant chunks not found in {eval_chunks_path}")
+
+    golds, sources = [], []
+    for ex in eval_data:
+        if ex.get("gold_answer"):
+            golds.append(ex["gold_answer"])
+            sources.append("eval_set")
+        elif ex["question"] in logged:
+            golds.append(logged[ex["question"]])
+            sources.append("eval_logs")
+        else:
+            golds.append(" ".join(chunk_text.get((ex["id"], cid), "") for cid in ex["relevant_chunk_ids"]))
+            sources.append("relevant_chunks")
+    return golds, sources
+
+
+def score_target(name, records, eval_data, targets, model, logged, k, eval_chunks_path=EVAL_CHUNKED):
+    """Semantic and keyword metrics for one target, all in batched array ops."""
+    from src.generation.context_packer import cleaned_text
+    from src.retrieval.doc_store import load_docs
+    from src.retrieval.index_factory import load_index, load_vector_lookup
+
+    index_path, docs_path = targets[name]
+    docs = load_docs(docs_path)
+    rows = [(ex, records[(name, question_key(ex))]) for ex in eval_data if (name, question_key(ex)) in records]
+    if not rows:
+        return None
+    examples = [ex for ex, _ in rows]
+    golds, sources = resolve_golds(examples, logged, eval_chunks_path)
+    answers = [r["answer"] for _, r in rows]
+
+    # Pad every row to k retrieved chunks; padding scores 0 and is masked out.
+    ids = np.full((len(rows), k), -1, dtype=np.int64)
+    for q, (_, r) in enumerate(rows):
+        row_ids = r["ids"][:k]
+        ids[q, :len(row_ids)] = row_ids
+    present = ids >= 0
+    chunk_rows = [[cleaned_text(docs[i]) if i >= 0 else "" for i in row] for row in ids]
+
+    lookup = load_vector_lookup(load_index(index_path), index_path)
+    if lookup is not None:
+        chunk_vecs = lookup(np.where(present, ids, 0).reshape(-1)).reshape(len(rows), k, -1)
+    else:  # no stored vectors to read back: encode the retrieved chunks
+        flat = [text for row in chunk_rows for text in row]
+        chunk_vecs = encode_queries(model, flat, ENCODE_BATCH_SIZE).reshape(len(rows), k, -1)
+    vecs = encode_queries(model, golds + answers, ENCODE_BATCH_SIZE)
+    gold_vecs, answer_vecs = vecs[:len(golds)], vecs[len(golds):]
+
+    semantic = (cosine_score_matrix(gold_vecs, chunk_vecs) >= SIM_THRESHOLD) & present
+    keyword = (keyword_score_matrix(golds, chunk_rows) >= KEYWORD_THRESHOLD) & present
+    answer_sim = cosine_score_matrix(gold_vecs, answer_vecs[:, None, :])[:, 0]
+    answer_kw = keyword_score_matrix(golds, [[a] for a in answers])[:, 0]
+    n_chunks = np.maximum(present.sum(axis=1), 1)
+
+    return {
+        "target": name,
+        "answered": len(rows),
+        "k": k,
+        "gold_sources": {s: sources.count(s) for s in sorted(set(sources))},
+        "semantic_recall": float((semantic.sum(axis=1) / n_chunks).mean()),
+        "semantic_hit_rate": float(semantic.any(axis=1).mean()),
+        "keyword_recall": float((keyword.sum(axis=1) / n_chunks).mean()),
+        "keyword_hit_rate": float(keyword.any(axis=1).mean()),
+        "answer_similarity": float(answer_sim.mean()),
+        "answer_keyword_overlap": float(answer_kw.mean()),
+        "mean_latency_s": float(np.mean([r["latency_s"] for _, r in rows])),
+    }
+
+
+def print_summary(summaries):
+    print(f"\n{'target':<12} {'answered':>8} {'sem R':>7} {'sem hit':>8} {'kw R':>7} {'kw hit':>7} "
+          f"{'ans sim':>8} {'ans kw':>7} {'lat s':>7}")
+    for s in summaries:
+        print(f"{s['target']:<12} {s['answered']:>8} {s['semantic_recall']:>7.4f} {s['semantic_hit_rate']:>8.4f} "
+              f"{s['keyword_recall']:>7.4f} {s['keyword_hit_rate']:>7.4f} {s['answer_similarity']:>8.4f} "
+              f"{s['answer_keyword_overlap']:>7.4f} {s['mean_latency_s']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and score answers for the whole eval set, resumably.")
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=sorted(TARGETS))
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT,
+                        help="Generations in flight; match the Ollama server's parallelism.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH,
+                        help="JSONL of per-question results; existing answers are reused.")
+    parser.add_argument("--gold-log", default=GOLD_LOG_PATH, help="App eval log with gold answers.")
+    parser.add_argument("--eval-chunks", default=EVAL_CHUNKED,
+                        help="Chunked eval posts; their relevant chunks are the fallback reference.")
+    parser.add_argument("--ollama-model", default=OLLAMA_MODEL)
+    parser.add_argument("--limit", type=int, help="Only the first N eval questions.")
+    parser.add_argument("--score-only", action="store_true", help="Skip generation; score the checkpoint.")
+    parser.add_argument("--output", help="Write the summary as JSON to this path.")
+    args = parser.parse_args()
+
+    from src.retrieval.embedding_backend import load_encoder
+
+    eval_data = load_jsonl(args.eval)[:args.limit]
+    targets = {name: TARGETS[name] for name in args.targets}
+    model = load_encoder(MODEL_NAME)
+    runs = {name: run_key(*targets[name], args.k, args.ollama_model) for name in targets}
+
+    if args.score_only:
+        records = load_checkpoint(args.checkpoint, runs)
+    else:
+        records = run_generation(eval_data, targets, runs, args.checkpoint, args.k, args.concurrency,
+                                 args.ollama_model, model)
+
+    logged = load_gold_answers(args.gold_log)
+    summaries = [s for s in (score_target(name, records, eval_data, targets, model, logged, args.k,
+                                          args.eval_chunks)
+                             for name in targets) if s is not None]
+    print_summary(summaries)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, indent=2)
+        print(f"\n📄 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# src/evaluation/evaluator.py
+
+import json
+import os
+import sys
+
+import numpy as np
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+RAG_INDEX_PATH = "data/processed/faiss_rag.index"
+RAG_DOCS_PATH = "data/processed/rag_docs.jsonl"
+CTX_INDEX_PATH = "data/processed/faiss_contextual.index"
+CTX_DOCS_PATH = "data/processed/contextual_docs.jsonl"
+EVAL_PATH = "data/processed/eval_questions.jsonl"
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+TOP_K = 5
+BATCH_SIZE = 256
+
+MISSING_DOC = -2  # code for FAISS "-1" rows; never equal to a gold code
+
+
+def load_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def encode_queries(model, questions, batch_size=BATCH_SIZE):
+    """Encode every eval question in large batches, once."""
+    vecs = model.encode(
+        questions,
+        batch_size=batch_size,
+        show_progress_bar=True,
+        convert_to_numpy=True,
+    )
+    return np.ascontiguousarray(vecs, dtype=np.float32)
+
+
+def search_all(index, query_vecs, k=TOP_K):
+    """Single matrix search: returns the (n_queries, k) row-ID matrix."""
+    _, indices = index.search(query_vecs, k)
+    return indices
+
+
+def encode_keys(docs, eval_data):
+    """Map (id, chunk_id) keys to integer codes for docs and gold sets.
+
+    Returns ``doc_codes`` (one code per index row) and ``gold_codes``, a
+    ``(n_queries, max_gold)`` matrix padded with -1.
+    """
+    key_to_code = {}
+    doc_codes = np.empty(len(docs), dtype=np.int64)
+    for i, doc in enumerate(docs):
+        key = (doc["id"], doc.get("chunk_id", 0))
+        doc_codes[i] = key_to_code.setdefault(key, len(key_to_code))
+
+    max_gold = max((len(ex["relevant_chunk_ids"]) for ex in eval_data), default=0)
+    gold_codes = np.full((len(eval_data), max(max_gold, 1)), -1, dtype=np.int64)
+    for q, ex in enumerate(eval_data):
+        for j, cid in enumerate(ex["relevant_chunk_ids"]):
+            gold_codes[q, j] = key_to_code.get((ex["id"], cid), -1)
+    return doc_codes, gold_codes
+
+
+def hit_matrix(indices, doc_codes, gold_codes):
+    """Boolean ``(n_queries, k)`` matrix: is the row at rank r relevant?"""
+    retrieved = np.where(indices >= 0, doc_codes[np.clip(indices, 0, None)], MISSING_DOC)
+    return (retrieved[:, :, None] == gold_codes[:, None, :]).any(axis=2)
+
+
+def compute_metrics(hits):
+    """Recall@1, Recall@K and MRR@K from a hit matrix."""
+    n, k = hits.shape
+    any_hit = hits.any(axis=1)
+    first_rank = hits.argmax(axis=1) + 1
+    reciprocal = np.where(any_hit, 1.0 / first_rank, 0.0)
+    return {
+        "total": n,
+        "k": k,
+        "recall_at_1_hits": int(hits[:, 0].sum()) if k else 0,
+        "recall_at_k_hits": int(any_hit.sum()),
+        "recall_at_1": float(hits[:, 0].mean()) if n and k else 0.0,
+        "recall_at_k": float(any_hit.mean()) if n else 0.0,
+        "mrr": float(reciprocal.mean()) if n else 0.0,
+    }
+
+
+def evaluate_index(index, docs, eval_data, query_vecs, k=TOP_K):
+    """Evaluate one index against precomputed query embeddings."""
+    indices = search_all(index, query_vecs, k)
+    doc_codes, gold_codes = encode_keys(docs, eval_data)
+    metrics = compute_metrics(hit_matrix(indices, doc_codes, gold_codes))
+    return metrics, indices
+
+
+def print_metrics(metrics, label=None):
+    total, k = metrics["total"], metrics["k"]
+    if label:
+        print(f"\n📊 {label}")
+    print(f"\n🎯 Recall@1:   {metrics['recall_at_1']:.4f} ({metrics['recall_at_1_hits']}/{total})")
+    print(f"🎯 Recall@{k}: {metrics['recall_at_k']:.4f} ({metrics['recall_at_k_hits']}/{total})")
+    print(f"📈 MRR@{k}:    {metrics['mrr']:.4f}")
+
+
+def print_examples(indices, docs, eval_data, n=3):
+    print("\n🔍 DEBUG: Show example retrievals")
+
+    for i in range(min(n, len(eval_data))):
+        ex = eval_data[i]
+        gold_ids = set((ex["id"], cid) for cid in ex["relevant_chunk_ids"])
+
+        print(f"\n🧠 Q{i+1}: {ex['question'][:80]}...")
+        print(f"Expected: {gold_ids}")
+
+        print("Retrieved:")
+        for rank, idx in enumerate(indices[i], 1):
+            if idx < 0:  # FAISS padding when fewer than k hits were found
+                continue
+            doc = docs[idx]
+            print(f"{rank}. ID: {doc['id']} | Chunk: {doc.get('chunk_id', 0)}")
+
+
+def run(targets, eval_path=EVAL_PATH, model_name=MODEL_NAME, k=TOP_K, show_examples=False):
+    """Evaluate several ``(label, index_path, docs_path)`` targets.
+
+    The eval set is encoded once and the embeddings are reused for every
+    index, so adding an index variant only costs one extra matrix search.
+    """
+    from src.retrieval.embedding_backend import load_encoder
+    from src.retrieval.doc_store import load_docs
+    from src.retrieval.index_factory import load_index
+
+    eval_data = load_jsonl(eval_path)
+    model = load_encoder(model_name)
+
+    print(f"Encoding {len(eval_data)} eval questions...")
+    query_vecs = encode_queries(model, [ex["question"] for ex in eval_data])
+
+    results = {}
+    for label, index_path, docs_path in targets:
+        index = load_index(index_path)
+        docs = load_docs(docs_path)
+        metrics, indices = evaluate_index(index, docs, eval_data, query_vecs, k)
+        print_metrics(metrics, label if len(targets) > 1 else None)
+        if show_examples:
+            print_examples(indices, docs, eval_data)
+        results[label] = metrics
+    return results
+
+
+def main():
+    run([
+        ("RAG", RAG_INDEX_PATH, RAG_DOCS_PATH),
+        ("Contextual", CTX_INDEX_PATH, CTX_DOCS_PATH),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# src/evaluation/index_sweep.py
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.evaluation.evaluator import EVAL_PATH, MODEL_NAME, encode_queries, load_jsonl
+from src.retrieval import index_factory
+
+INDEX_PATH = "data/processed/faiss_rag.index"
+TOP_K = 5
+MAX_QUERIES = 1000
+
+# (index_type, build params, search param name, values to sweep)
+SWEEP = [
+    ("flat", {}, None, [None]),
+    ("ivf_flat", {}, "nprobe", [1, 4, 16, 64]),
+    ("ivf_pq", {}, "nprobe", [4, 16, 64]),
+    ("hnsw", {}, "ef_search", [16, 32, 64, 128]),
+]
+
+
+def index_size_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def recall_vs_exact(approx, exact):
+    """Mean |approx ∩ exact| / k over queries (Recall@k against flat)."""
+    k = exact.shape[1]
+    hits = (approx[:, :, None] == exact[:, None, :]).any(axis=2) & (approx >= 0)
+    return float(hits.sum(axis=1).mean() / k)
+
+
+def time_queries(index, queries, k):
+    """Per-query latencies in milliseconds, one query per search call."""
+    latencies = np.empty(len(queries))
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, idx = index.search(queries[i:i + 1], k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        results[i] = idx[0]
+    return latencies, results
+
+
+def load_queries(args, xb):
+    if args.sample_queries:
+        rng = np.random.default_rng(0)
+        picks = rng.choice(len(xb), min(args.max_queries, len(xb)), replace=False)
+        return np.ascontiguousarray(xb[picks])
+
+    from src.retrieval.embedding_backend import load_encoder
+    eval_data = load_jsonl(args.eval)[:args.max_queries]
+    model = load_encoder(MODEL_NAME)
+    return encode_queries(model, [ex["question"] for ex in eval_data])
+
+
+def run_sweep(xb, queries, k, sweep=SWEEP):
+    flat = index_factory.build_index(xb, "flat")
+    _, exact = flat.search(queries, k)
+
+    rows = []
+    for index_type, build_params, param_name, values in sweep:
+        print(f"Building {index_type} {build_params or ''}...")
+        start = time.perf_counter()
+        index = index_factory.build_index(xb, index_type, **build_params)
+        build_s = time.perf_counter() - start
+        size = index_size_bytes(index)
+
+        for value in values:
+            if param_name:
+                index_factory.apply_search_params(index, **{param_name: value})
+            latencies, approx = time_queries(index, queries, k)
+            rows.append({
+                "index_type": index_type,
+                "build_params": build_params,
+                "search_param": param_name,
+                "search_value": value,
+                f"recall_at_{k}": recall_vs_exact(approx, exact),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "size_mb": size / 2**20,
+                "build_s": build_s,
+            })
+    return rows
+
+
+def print_table(rows, k):
+    print(f"\n{'index':<10} {'param':<16} {'R@' + str(k):>7} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>9}")
+    for r in rows:
+        param = f"{r['search_param']}={r['search_value']}" if r["search_param"] else "-"
+        print(f"{r['index_type']:<10} {param:<16} {r[f'recall_at_{k}']:>7.4f} "
+              f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['size_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency sweep of FAISS index types against a flat baseline.")
+    parser.add_argument("--index", default=INDEX_PATH, help="Index whose corpus vectors are swept (vector sidecar or flat index).")
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--max-queries", type=int, default=MAX_QUERIES)
+    parser.add_argument("--sample-queries", action="store_true",
+                        help="Use corpus vectors as queries instead of encoding the eval set.")
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    print(f"Loading corpus vectors for {args.index}...")
+    xb = index_factory.load_corpus_vectors(args.index)
+    queries = load_queries(args, xb)
+
+    rows = run_sweep(xb, queries, args.k)
+    print_table(rows, args.k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📄 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# src/generation/answer_cache.py
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+SIM_THRESHOLD = 0.95     # cosine between query embeddings for a reuse
+MAXSIZE = 2048
+TTL = 24 * 3600          # seconds; None keeps answers until evicted
+NEIGHBOURS = 8           # similar queries checked for a matching context
+SAVE_EVERY = 20          # persist after this many new answers
+
+
+def _normalize(vec):
+    vec = np.asarray(vec, dtype=np.float32).reshape(1, -1)
+    return vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+
+class SemanticAnswerCache:
+    """Generated answers keyed by query embedding plus retrieved chunk IDs.
+
+    A lookup finds the nearest cached queries by cosine similarity (inner
+    product over normalized vectors). It returns the answer of the closest
+    one at or above ``threshold`` that was generated from the same chunks
+    in the same namespace, so the reused answer is always grounded in the
+    context the caller would have sent. The index is an exact flat
+    inner-product index: at a few thousand entries a scan takes
+    microseconds and needs no training. Entries expire after ``ttl`` seconds
+    and the least recently used are evicted beyond ``maxsize``.
+
+    Chunk IDs are row numbers, so they only mean something for one build
+    of the indexes. ``version`` identifies that build; it is saved with the
+    cache, and saved entries from another version are discarded on load.
+    """
+
+    def __init__(self, threshold=SIM_THRESHOLD, maxsize=MAXSIZE, ttl=TTL, path=None, version=None):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.context_misses = 0   # similar question, but different retrieved chunks
+        self.evictions = 0
+        self.expirations = 0
+        self._index = None
+        self._entries = {}        # id -> entry dict (vector kept for persistence)
+        self._next_id = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if self.path is not None and (self.path / "entries.json").exists():
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _ensure_index(self, dim):
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def _remove(self, ids):
+        # Caller holds the lock.
+        if ids:
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+            for i in ids:
+                del self._entries[i]
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and entry["created"] + self.ttl < now
+
+    def get(self, query_vec, chunk_ids, namespace=""):
+        """Cached ``{"answer", "query", "similarity"}`` or None."""
+        vec = _normalize(query_vec)
+        chunk_ids = [int(i) for i in chunk_ids]
+        now = time.time()
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            sims, ids = self._index.search(vec, min(NEIGHBOURS, len(self._entries)))
+            expired, similar = [], False
+            for sim, i in zip(sims[0], ids[0]):
+                if i < 0 or sim < self.threshold:
+                    break
+                entry = self._entries[int(i)]
+                if self._expired(entry, now):
+                    expired.append(int(i))
+                    continue
+                similar = True
+                if entry["namespace"] == namespace and entry["chunk_ids"] == chunk_ids:
+                    entry["last_used"] = now
+                    self.hits += 1
+                    self.expirations += len(expired)
+                    self._remove(expired)
+                    return {"answer": entry["answer"], "query": entry["query"], "similarity": float(sim)}
+            self.expirations += len(expired)
+            self._remove(expired)
+            self.misses += 1
+            self.context_misses += similar
+            return None
+
+    def put(self, query_vec, chunk_ids, answer, namespace="", query=""):
+        vec = _normalize(query_vec)
+        now = time.time()
+        with self._lock:
+            self._ensure_index(vec.shape[1])
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "query": query,
+                "namespace": namespace,
+                "chunk_ids": [int(i) for i in chunk_ids],
+                "answer": answer,
+                "created": now,
+                "last_used": now,
+                "vector": vec[0],
+            }
+            if len(self._entries) > self.maxsize:
+                by_age = sorted(self._entries, key=lambda i: self._entries[i]["last_used"])
+                evicted = by_age[:len(self._entries) - self.maxsize]
+                self.evictions += len(evicted)
+                self._remove(evicted)
+            self._unsaved += 1
+            save = self.path is not None and self._unsaved >= SAVE_EVERY
+        if save:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            if self._index is not None:
+                self._index.reset()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "context_misses": self.context_misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    # === Persistence ===
+    def save(self, path=None):
+        """Write ``entries.json``, ``vectors.npy`` and ``meta.json`` (atomically replaced)."""
+        path = Path(path or self.path)
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            ids = sorted(self._entries)
+            entries = [{k: v for k, v in self._entries[i].items() if k != "vector"} for i in ids]
+            vectors = (np.stack([self._entries[i]["vector"] for i in ids]) if ids
+                       else np.empty((0, 0), dtype=np.float32))
+            self._unsaved = 0
+        with open(path / "vectors.npy.tmp", "wb") as f:
+            np.save(f, vectors)
+        with open(path / "entries.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        with open(path / "meta.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": self.version}, f)
+        os.replace(path / "vectors.npy.tmp", path / "vectors.npy")
+        os.replace(path / "entries.json.tmp", path / "entries.json")
+        os.replace(path / "meta.json.tmp", path / "meta.json")
+
+    def load(self, path=None):
+        """Restore saved entries, dropping any that expired meanwhile.
+
+        Nothing is restored when the cache was saved for another ``version``
+        (or before versions were recorded) while this one has a version.
+        """
+        path = Path(path or self.path)
+        try:
+            with open(path / "meta.json", "r", encoding="utf-8") as f:
+                saved_version = json.load(f).get("version")
+        except FileNotFoundError:
+            saved_version = None
+        if self.version is not None and saved_version != self.version:
+            print(f"Answer cache in {path} was built for other indexes; starting empty.")
+            self.clear()
+            return
+        with open(path / "entries.json", "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        vectors = np.load(path / "vectors.npy")
+        now = time.time()
+        self.clear()
+        for entry, vec in zip(entries, vectors):
+            if self._expired(entry, now):
+                continue
+            with self._lock:
+                self._ensure_index(len(vec))
+                entry_id = self._next_id
+                self._next_id += 1
+                self._index.add_with_ids(vec[None, :], np.array([entry_id], dtype=np.int64))
+                self._entries[entry_id] = {**entry, "vector": vec}
@@ -0,0 +1,137 @@
+# src/generation/context_packer.py
+
+import html
+import math
+import os
+import re
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.retrieval.query_cache import LRUCache
+from src.text_utils import split_sentences
+
+DEFAULT_NUM_CTX = 2048      # Ollama's default context window
+ANSWER_RESERVE = 512        # tokens left free for the generated answer
+CHARS_PER_TOKEN = 4         # English text with SentencePiece/BPE vocabularies
+MAX_CHUNK_SHARE = 0.5       # no single chunk may take more of the budget
+DUPLICATE_JACCARD = 0.8     # word-bigram overlap above which a chunk is a duplicate
+MIN_USEFUL_TOKENS = 16      # stop packing when less than this is left
+CLEAN_CACHE_SIZE = 16384
+
+WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in is it of on or "
+    "so that the this to was what when where which who why will with you your".split()
+)
+
+_clean_cache = LRUCache(CLEAN_CACHE_SIZE)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate; exact counts would need the served model's tokenizer."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def context_budget(prompt_overhead, num_ctx=DEFAULT_NUM_CTX, answer_reserve=ANSWER_RESERVE,
+                   count_tokens=estimate_tokens):
+    """Tokens available for context once the template, question and answer fit."""
+    return max(0, num_ctx - answer_reserve - count_tokens(prompt_overhead))
+
+
+def clean_html(text):
+    """Remove HTML tags and decode common entities."""
+    if not isinstance(text, str):
+        return ""
+    no_tags = re.sub(r"<[^>]*>", "", text)
+    return html.unescape(no_tags)
+
+
+def cleaned_text(chunk):
+    """``clean_html`` of a chunk's text, cached per chunk ID.
+
+    The text hash is part of the key because the RAG and contextual stores
+    share chunk IDs but not text.
+    """
+    text = chunk.get("text", "")
+    key = (chunk.get("id"), chunk.get("chunk_id"), hash(text))
+    return _clean_cache.get_or_compute(key, lambda: clean_html(text))
+
+
+def _terms(text):
+    return {w for w in WORD.findall(text.lower()) if w not in STOPWORDS}
+
+
+def _shingles(text):
+    words = WORD.findall(text.lower())
+    return set(zip(words, words[1:])) or set(words)
+
+
+def _jaccard(a, b):
+    union = a | b
+    return len(a & b) / len(union) if union else 1.0
+
+
+def trim_to_relevant(text, query_terms, max_tokens, count_tokens=estimate_tokens):
+    """Keep the sentences that share the most terms with the query.
+
+    Sentences are chosen by overlap (earlier ones win ties) until
+    ``max_tokens`` is reached, then emitted in their original order.
+    Returns "" when no query-relevant sentence fits.
+    """
+    sentences = split_sentences(text)
+    scored = [(len(_terms(s) & query_terms), i) for i, s in enumerate(sentences)]
+    chosen, used = [], 0
+    for score, i in sorted(scored, key=lambda x: (-x[0], x[1])):
+        if score == 0:
+            break
+        cost = count_tokens(sentences[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.append(i)
+        used += cost
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def pack_context(chunks, query, max_tokens, count_tokens=estimate_tokens):
+    """Fit retrieved chunks into ``max_tokens``; returns ``(texts, stats)``.
+
+    Chunks are taken in retrieval order. Near-duplicates of an already
+    packed chunk are dropped. A chunk is kept whole if it fits its share
+    of the remaining budget, otherwise it is trimmed to its query-relevant
+    sentences.
+    """
+    query_terms = _terms(query)
+    texts, kept_shingles = [], []
+    stats = {"chunks": len(chunks), "packed": 0, "duplicates": 0, "trimmed": 0, "dropped": 0,
+             "input_tokens": 0, "tokens": 0, "budget": max_tokens}
+    remaining = max_tokens
+    for chunk in chunks:
+        text = cleaned_text(chunk).strip()
+        cost = count_tokens(text)
+        stats["input_tokens"] += cost
+        if remaining < MIN_USEFUL_TOKENS:
+            stats["dropped"] += 1
+            continue
+
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, seen) >= DUPLICATE_JACCARD for seen in kept_shingles):
+            stats["duplicates"] += 1
+            continue
+
+        allowance = min(remaining, max(MIN_USEFUL_TOKENS, int(max_tokens * MAX_CHUNK_SHARE)))
+        if cost > allowance:
+            text = trim_to_relevant(text, query_terms, allowance, count_tokens)
+            if not text:
+                stats["dropped"] += 1
+                continue
+            cost = count_tokens(text)
+            stats["trimmed"] += 1
+
+        texts.append(text)
+        kept_shingles.append(shingles)
+        remaining -= cost
+        stats["tokens"] += cost
+        stats["packed"] += 1
+    return texts, stats
@@ -1,44 +1,80 @@
 # src/generation/generate_answers.py
 
 import json
-import subprocess
+import os
+import sys
+import time
 
-import re
-import html
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-def clean_html(text):
-    """Remove HTML tags and decode common entities."""
-    if not isinstance(text, str):
-        return ""
-    no_tags = re.sub(r"<[^>]*>", "", text)
-    return html.unescape(no_tags)
+from src.generation.context_packer import DEFAULT_NUM_CTX, context_budget, pack_context
+from src.generation.ollama_client import get_client
+from src.tracing import NOOP_TRACE
 
-def format_prompt(context_chunks, query):
-    context_text = "\n\n".join([clean_html(c['text']) for c in context_chunks])
-    return f"""Answer the following question using the context below.
+# Context window the prompt is packed for; also sent to Ollama when set.
+NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", DEFAULT_NUM_CTX))
+OLLAMA_OPTIONS = {"num_ctx": NUM_CTX} if "OLLAMA_NUM_CTX" in os.environ else None
+
+PROMPT_TEMPLATE = """Answer the following question using the context below.
 
 Question:
 {query}
 
 Context:
-{context_text}
+{context}
 
 Answer:"""
 
+def format_prompt(context_chunks, query, max_tokens=None, trace=NOOP_TRACE):
+    """Prompt whose context is packed into the model's token budget.
+
+    ``max_tokens`` defaults to what ``NUM_CTX`` leaves after the template,
+    the question and room for the answer.
+    """
+    with trace.span("prompt_build") as span:
+        if max_tokens is None:
+            max_tokens = context_budget(PROMPT_TEMPLATE.format(query=query, context=""), NUM_CTX)
+        texts, stats = pack_context(context_chunks, query, max_tokens)
+        span.set(**stats)
+        return PROMPT_TEMPLATE.format(query=query, context="\n\n".join(texts))
+
+
+def run_ollama_prompt(prompt, model="gemma3:latest", options=None):
+    return get_client().generate(prompt, model=model, options=options)
 
-def run_ollama_prompt(prompt, model="gemma3:latest"):
-    result = subprocess.run(
-        ["ollama", "run", model],
-        input=prompt.encode("utf-8"),
-        capture_output=True
-    )
-    return result.stdout.decode("utf-8")
+def stream_ollama_prompt(prompt, model="gemma3:latest", options=None):
+    """Stream answer tokens from the shared, pooled Ollama client.
+
+    Returns the client's completion; its ``stats`` are filled in once all
+    tokens have been read.
+    """
+    return get_client().stream(prompt, model=model, options=options)
 
 def generate_answer(query, retrieved_chunks, model="gemma3:latest"):
     prompt = format_prompt(retrieved_chunks, query)
-    answer = run_ollama_prompt(prompt, model=model)
+    answer = run_ollama_prompt(prompt, model=model, options=OLLAMA_OPTIONS)
     return answer
 
+def stream_answer(query, retrieved_chunks, model="gemma3:latest", trace=NOOP_TRACE):
+    """Like ``generate_answer`` but yields tokens as they are generated.
+
+    With a trace, the Ollama call is recorded as ``ollama_ttft`` (time to
+    the first token) and ``ollama_total``.
+    """
+    prompt = format_prompt(retrieved_chunks, query, trace=trace)
+    with trace.span("ollama_total", model=model) as span:
+        start = time.perf_counter()
+        tokens = 0
+        completion = stream_ollama_prompt(prompt, model=model, options=OLLAMA_OPTIONS)
+        for token in completion:
+            if tokens == 0:
+                trace.add("ollama_ttft", time.perf_counter() - start, model=model)
+            tokens += 1
+            yield token
+        span.set(tokens=tokens, prompt_tokens=completion.stats.get("prompt_eval_count"),
+                 output_tokens=completion.stats.get("eval_count"))
+
 # example call
 if __name__ == "__main__":
     # Load dummy chunks from previous RAG result to test
@@ -0,0 +1,135 @@
+# src/generation/ollama_client.py
+
+import json
+import os
+import threading
+
+import httpx
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_MODEL = "gemma3:latest"
+DEFAULT_KEEP_ALIVE = "30m"      # keep the model loaded between questions
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 120.0            # max wait between two streamed chunks
+POOL_TIMEOUT = 5.0              # max wait for a free pooled connection
+MAX_CONNECTIONS = 8
+
+
+class OllamaError(RuntimeError):
+    """Raised when the Ollama server reports an error for a request."""
+
+
+def resolve_host(host=None):
+    """Ollama host from the argument or ``OLLAMA_HOST``, with a scheme."""
+    host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_HOST
+    if "://" not in host:
+        host = "http://" + host
+    return host.rstrip("/")
+
+
+class Completion:
+    """One streamed completion: iterate it for tokens.
+
+    Once the stream is exhausted, ``stats`` holds the final ``done``
+    message (timings, token counts, ``context``) of this call only.
+    """
+
+    def __init__(self, client, payload):
+        self.stats = {}
+        self._tokens = self._stream(client, payload)
+
+    def __iter__(self):
+        return self._tokens
+
+    def close(self):
+        """Abandon the stream and return its connection to the pool."""
+        self._tokens.close()
+
+    def _stream(self, client, payload):
+        with client.stream("POST", "/api/generate", json=payload) as response:
+            if response.status_code != 200:
+                response.read()
+                raise OllamaError(f"Ollama returned {response.status_code}: {response.text}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                token = chunk.get("response")
+                if token:
+                    yield token
+                if chunk.get("done"):
+                    # Keep reading to the end of the body so the connection
+                    # goes back to the pool instead of being closed.
+                    self.stats = {k: v for k, v in chunk.items() if k != "response"}
+
+
+class OllamaClient:
+    """Pooled HTTP client for the Ollama ``/api/generate`` endpoint.
+
+    Connections are kept alive across requests, and completions are
+    streamed back token by token instead of being buffered.
+    """
+
+    def __init__(self, host=None, keep_alive=DEFAULT_KEEP_ALIVE, options=None,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 pool_timeout=POOL_TIMEOUT, max_connections=MAX_CONNECTIONS):
+        self.host = resolve_host(host)
+        self.keep_alive = keep_alive
+        self.options = dict(options or {})
+        self._client = httpx.Client(
+            base_url=self.host,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    def _payload(self, prompt, model, options, keep_alive, stream, **extra):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive if keep_alive is None else keep_alive,
+        }
+        merged = {**self.options, **(options or {})}
+        if merged:
+            payload["options"] = merged
+        payload.update({k: v for k, v in extra.items() if v is not None})
+        return payload
+
+    def stream(self, prompt, model=DEFAULT_MODEL, options=None, keep_alive=None, **extra):
+        """Return a :class:`Completion` yielding tokens as the server produces them.
+
+        The request is sent when iteration starts; per-call stats are on
+        the returned completion, so concurrent streams never mix them.
+        """
+        payload = self._payload(prompt, model, options, keep_alive, True, **extra)
+        return Completion(self._client, payload)
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, keep_alive=None, **extra):
+        """Return the full completion as one string."""
+        return "".join(self.stream(prompt, model, options, keep_alive, **extra))
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client so every caller shares one connection pool."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = OllamaClient()
+    return _shared_client
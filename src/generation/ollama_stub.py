@@ -0,0 +1,141 @@
+# src/generation/ollama_stub.py
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "This is a stub answer generated without a language model."
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client pooling is exercised
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "stub:latest"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        server = self.server
+        server.requests += 1
+        start = time.perf_counter()
+        tokens = [w + " " for w in server.reply.split()]
+        time.sleep(server.first_token_delay)
+
+        if not request.get("stream", True):
+            time.sleep(server.token_delay * len(tokens))
+            self._send_json(200, {"model": request.get("model"), "response": "".join(tokens), "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            self._write_chunk({"model": request.get("model"), "response": token, "done": False})
+            time.sleep(server.token_delay)
+        self._write_chunk({
+            "model": request.get("model"),
+            "response": "",
+            "done": True,
+            "prompt_eval_count": len(request.get("prompt", "").split()),
+            "eval_count": len(tokens),
+            "total_duration": int((time.perf_counter() - start) * 1e9),
+            "context": [1, 2, 3],
+        })
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StubOllamaServer:
+    """Minimal local stand-in for the Ollama HTTP API.
+
+    Streams a canned reply word by word from ``/api/generate`` with
+    configurable time-to-first-token and per-token delays.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, reply=DEFAULT_REPLY,
+                 first_token_delay=0.0, token_delay=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.reply = reply
+        self.httpd.first_token_delay = first_token_delay
+        self.httpd.token_delay = token_delay
+        self.httpd.requests = 0
+        self.httpd.connections = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, first_token_delay=args.first_token_delay,
+                              token_delay=args.token_delay)
+    print(f"Stub Ollama server listening on {server.url}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
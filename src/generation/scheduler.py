@@ -0,0 +1,110 @@
+# src/generation/scheduler.py
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Generations run at once. Matches Ollama's own OLLAMA_NUM_PARALLEL when
+# that is set in the app's environment; past it the server queues or
+# thrashes between requests.
+MAX_CONCURRENT = int(os.environ.get("OLLAMA_CONCURRENCY", os.environ.get("OLLAMA_NUM_PARALLEL", 2)))
+MAX_QUEUE = int(os.environ.get("OLLAMA_MAX_QUEUE", 8))   # waiting generations before rejecting
+QUEUE_TIMEOUT_S = float(os.environ.get("OLLAMA_QUEUE_TIMEOUT", 30))
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a generation is rejected: the queue is full or the wait timed out."""
+
+
+class Slot:
+    __slots__ = ("wait_s",)
+
+    def __init__(self, wait_s):
+        self.wait_s = wait_s
+
+
+class GenerationScheduler:
+    """Bounded admission for Ollama generations.
+
+    At most ``max_concurrent`` generations hold a slot. Up to ``max_queue``
+    more wait for one in FIFO order; a released slot is handed straight to
+    the oldest waiter. A request arriving at a full queue is rejected
+    immediately, and a waiter gives up after ``queue_timeout_s``, so load
+    beyond capacity fails fast instead of stretching every answer's latency.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, queue_timeout_s=QUEUE_TIMEOUT_S):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self._waiters = deque()   # Events, oldest first
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take a slot; returns seconds spent queued. Raises ``SchedulerBusy``."""
+        timeout = self.queue_timeout_s if timeout is None else timeout
+        start = time.perf_counter()
+        with self._lock:
+            if self.running < self.max_concurrent and not self._waiters:
+                self.running += 1
+                self.admitted += 1
+                return 0.0
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy(f"generation queue is full ({len(self._waiters)} waiting, "
+                                    f"{self.running} running)")
+            granted = threading.Event()
+            self._waiters.append(granted)
+
+        if not granted.wait(timeout):
+            with self._lock:
+                if not granted.is_set():  # a release may have handed us the slot meanwhile
+                    self._waiters.remove(granted)
+                    self.timeouts += 1
+                    raise SchedulerBusy(f"no generation slot free after {timeout:g}s")
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.admitted += 1
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+        return waited
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes on; running is unchanged
+            else:
+                self.running -= 1
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """``with scheduler.slot() as s:`` holds a slot; ``s.wait_s`` is the queue wait."""
+        wait_s = self.acquire(timeout)
+        try:
+            yield Slot(wait_s)
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self.running,
+                "queued": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "mean_wait_s": self.total_wait_s / self.admitted if self.admitted else 0.0,
+                "max_wait_s": self.max_wait_s,
+            }
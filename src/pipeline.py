@@ -0,0 +1,491 @@
+# src/pipeline.py
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.data_preparation.chunk_documents import CHUNK_SIZE, TOKEN_CHUNK_SIZE, TOKENIZER_NAME
+from src.data_preparation.columnar import input_path, output_path
+from src.data_preparation.splitting import EVAL_RATIO, SPLIT_SALT
+from src.evaluation.evaluator import TOP_K
+from src.retrieval import index_factory
+from src.retrieval.embedding_backend import EMBED_MODEL_NAME, resolve_backend
+
+BASE_PATH = Path(__file__).resolve().parent.parent
+SRC = BASE_PATH / "src"
+PROCESSED = BASE_PATH / "data/processed"
+STATE_PATH = PROCESSED / ".pipeline_state.json"
+HASH_BLOCK = 1 << 20   # bytes read at a time when hashing input files
+
+# Parameters that change what a stage writes; every value here is part of
+# that stage's fingerprint. Override them with --config / --set.
+DEFAULT_PARAMS = {
+    "split": {"ratio": EVAL_RATIO, "salt": SPLIT_SALT},
+    "chunk": {"unit": "chars", "split": "fixed", "size": None, "overlap": 0,
+              "tokenizer": TOKENIZER_NAME},
+    "contextualize": {"mode": "chunk"},
+    "embed": {"model": EMBED_MODEL_NAME},
+    "index": {"index_type": "flat", "nlist": index_factory.DEFAULT_NLIST, "pq_m": index_factory.DEFAULT_PQ_M,
+              "pq_nbits": index_factory.DEFAULT_PQ_NBITS, "hnsw_m": index_factory.DEFAULT_HNSW_M,
+              "ef_construction": index_factory.DEFAULT_EF_CONSTRUCTION, "nprobe": index_factory.DEFAULT_NPROBE,
+              "ef_search": index_factory.DEFAULT_EF_SEARCH, "normalize": False,
+              "vector_dtype": "float32", "shards": 1, "bm25": True},
+    "evaluate": {"k": TOP_K},
+}
+
+
+class StageIncomplete(RuntimeError):
+    """A stage finished without producing all of its outputs; re-run to resume."""
+
+
+class Stage:
+    """One step of the pipeline: ``run(stage)`` turns ``inputs`` into ``outputs``.
+
+    ``params`` and the source files in ``code`` are fingerprinted; settings
+    that cannot change the outputs (worker counts, concurrency) go in
+    ``options`` so tuning them never triggers a rebuild. ``run`` returns
+    False when it stopped short; a ``resumable`` stage keeps its partial
+    outputs for the next run instead of starting over.
+    """
+
+    def __init__(self, name, run, inputs, outputs, params=None, code=(), options=None, resumable=False):
+        self.name = name
+        self.run = run
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.params = params or {}
+        self.code = [Path(p) for p in code]
+        self.options = options or {}
+        self.resumable = resumable
+
+
+# === Fingerprints ===
+def rel(path):
+    """Path as recorded in the state file, relative to the project root."""
+    try:
+        return Path(path).resolve().relative_to(BASE_PATH).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def file_digest(path, cache):
+    """Content hash of a file, reused while its size and mtime are unchanged."""
+    st = os.stat(path)
+    entry = cache.get(rel(path))
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["digest"]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    cache[rel(path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": digest}
+    return digest
+
+
+def output_digest(path, cache):
+    """Content hash of an output file, or of every file under an output directory."""
+    path = Path(path)
+    if not path.is_dir():
+        return file_digest(path, cache)
+    h = hashlib.blake2b(digest_size=16)
+    for p in sorted(path.rglob("*")):
+        if p.is_file():
+            h.update(f"{p.relative_to(path).as_posix()}:{file_digest(p, cache)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def output_stat(path):
+    """``[size, mtime_ns]`` of an output (summed over a directory), or None if missing."""
+    path = Path(path)
+    if path.is_dir():
+        stats = [p.stat() for p in sorted(path.rglob("*")) if p.is_file()]
+        return [sum(s.st_size for s in stats), max((s.st_mtime_ns for s in stats), default=0), len(stats)]
+    if path.exists():
+        st = path.stat()
+        return [st.st_size, st.st_mtime_ns]
+    return None
+
+
+def remove(path):
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+# === State ===
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"stages": {}, "files": {}}
+
+
+def save_state(state, path=STATE_PATH):
+    """Write via a temp file so an interrupted run never leaves a torn state file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# === Runner ===
+class Pipeline:
+    """Runs stages in dependency order, rebuilding only stale ones.
+
+    A stage's fingerprint hashes its name, params and code together with
+    the content hash of each input: for a file another stage writes, the
+    hash that stage recorded when it last built it. A change anywhere
+    upstream therefore reaches every stage below it, including when a
+    forced or nondeterministic stage writes different outputs, while a
+    rebuild that writes identical outputs leaves its dependents alone.
+    """
+
+    def __init__(self, stages, state_path=STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}   # definition order is a valid build order
+        self.producer = {rel(out): stage.name for stage in stages for out in stage.outputs}
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        self._fingerprints = {}
+
+    def dependencies(self, name):
+        stage = self.stages[name]
+        return sorted({self.producer[rel(p)] for p in stage.inputs if rel(p) in self.producer},
+                      key=list(self.stages).index)
+
+    def plan(self, targets=None):
+        """``targets`` and everything upstream of them, in build order."""
+        wanted = set()
+        todo = list(targets or self.stages)
+        while todo:
+            name = todo.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage {name!r} (expected one of {list(self.stages)})")
+            if name not in wanted:
+                wanted.add(name)
+                todo.extend(self.dependencies(name))
+        return [name for name in self.stages if name in wanted]
+
+    def fingerprint(self, name):
+        if name in self._fingerprints:
+            return self._fingerprints[name]
+        stage = self.stages[name]
+        files = self.state.setdefault("files", {})
+        inputs = {}
+        for path in stage.inputs:
+            producer = self.producer.get(rel(path))
+            if producer is not None:
+                record = self.state["stages"].get(producer) or {}
+                inputs[rel(path)] = record.get("digests", {}).get(rel(path))
+            elif path.exists():
+                inputs[rel(path)] = file_digest(path, files)
+            else:
+                raise FileNotFoundError(f"{name}: input {path} is missing and no stage produces it")
+        payload = {
+            "stage": name,
+            "params": stage.params,
+            "code": {rel(p): file_digest(p, files) for p in stage.code},
+            "inputs": inputs,
+        }
+        digest = hashlib.blake2b(json.dumps(payload, sort_keys=True, default=str).encode("utf-8"),
+                                 digest_size=16).hexdigest()
+        self._fingerprints[name] = digest
+        return digest
+
+    def stale_reason(self, name, force=False):
+        """Why ``name`` must be rebuilt, or None when its outputs are current."""
+        if force:
+            return "forced"
+        record = self.state["stages"].get(name)
+        if record is None:
+            return "never built"
+        if record["fingerprint"] != self.fingerprint(name):
+            return "inputs, parameters or code changed"
+        if not record["complete"]:
+            return "previous run did not finish"
+        for path in self.stages[name].outputs:
+            stat = output_stat(path)
+            if stat is None:
+                return f"{rel(path)} is missing"
+            if stat != record["outputs"].get(rel(path)):
+                return f"{rel(path)} was modified"
+        return None
+
+    def build(self, name, force=False):
+        stage = self.stages[name]
+        fingerprint = self.fingerprint(name)
+        record = self.state["stages"].get(name)
+        resume = stage.resumable and not force and (record is None or record["fingerprint"] == fingerprint)
+        for path in stage.outputs:
+            if not resume:
+                remove(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.state["stages"][name] = {"fingerprint": fingerprint, "complete": False, "outputs": {}}
+        save_state(self.state, self.state_path)
+        start = time.perf_counter()
+        complete = stage.run(stage) is not False
+        files = self.state.setdefault("files", {})
+        self.state["stages"][name] = {
+            "fingerprint": fingerprint,
+            "complete": complete,
+            "seconds": round(time.perf_counter() - start, 3),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "outputs": {rel(p): output_stat(p) for p in stage.outputs},
+            "digests": {rel(p): output_digest(p, files) for p in stage.outputs if p.exists()},
+        }
+        save_state(self.state, self.state_path)
+        self._fingerprints.clear()  # dependents now hash the new outputs
+        if not complete:
+            raise StageIncomplete(f"{name} did not finish; re-run to resume it")
+
+    def run(self, targets=None, force=(), dry_run=False):
+        """Bring ``targets`` up to date; returns the names of the stages (to be) rebuilt."""
+        rebuilt = []
+        for name in self.plan(targets):
+            upstream = [dep for dep in self.dependencies(name) if dep in rebuilt]
+            if dry_run and upstream:
+                # Its inputs are only known once they have been rebuilt
+                reason = f"{', '.join(upstream)} will be rebuilt"
+            else:
+                reason = self.stale_reason(name, name in force)
+            if reason is None:
+                print(f"✔️ {name}: up to date")
+                continue
+            rebuilt.append(name)
+            print(f"▶️ {name}: {reason}")
+            if not dry_run:
+                start = time.perf_counter()
+                self.build(name, name in force)
+                print(f"✅ {name} finished in {time.perf_counter() - start:.1f}s")
+        if not rebuilt:
+            print("Nothing to do.")
+        # Refresh cached file hashes even when nothing was rebuilt
+        if not dry_run:
+            save_state(self.state, self.state_path)
+        return rebuilt
+
+
+# === Stages ===
+def run_split(stage):
+    from src.data_preparation.split_questions_before_chunking import split_posts
+
+    n_train, n_eval = split_posts(stage.inputs[0], *stage.outputs, stage.params["ratio"], stage.params["salt"])
+    print(f"  {n_train} train and {n_eval} eval posts")
+
+
+def run_chunk(stage):
+    from src.data_preparation.chunk_documents import chunk_documents
+
+    for src, dst in zip(stage.inputs, stage.outputs):
+        n_chunks = chunk_documents(src, dst, stage.params, stage.options["workers"])
+        print(f"  {n_chunks} chunks in {rel(dst)}")
+
+
+def run_eval_questions(stage):
+    from src.data_preparation.generate_eval_questions import generate_eval_questions
+
+    n = generate_eval_questions(stage.inputs[0], stage.outputs[0])
+    print(f"  {n} eval questions")
+
+
+def run_contextualize(stage):
+    from src.data_preparation.chunk_documents_contextual import run_pipeline
+
+    _, failed, _ = asyncio.run(run_pipeline(
+        stage.inputs[0], stage.outputs[0], stage.outputs[1],
+        concurrency=stage.options["concurrency"], mode=stage.params["mode"]))
+    return failed == 0
+
+
+def run_embed(stage):
+    import numpy as np
+
+    from src.data_preparation.columnar import iter_records
+    from src.retrieval.embedding_backend import encoder_id, load_encoder
+    from src.retrieval.embedding_cache import CACHE_DIR, EmbeddingCache
+
+    chunks = [item["chunk"] for item in iter_records(stage.inputs[0], columns=["chunk"])]
+    print(f"  Embedding {len(chunks)} chunks...")
+    model = load_encoder(stage.params["model"])
+    cache = EmbeddingCache(CACHE_DIR / stage.options["cache"], encoder_id(stage.params["model"]))
+    embeddings = np.asarray(cache.embed(chunks, model), dtype=np.float32)
+    cache.evict_stale()
+    np.save(stage.outputs[0], embeddings)
+
+
+def run_index(stage):
+    import numpy as np
+
+    import src.retrieval.contextual_retriever as contextual_retriever
+    import src.retrieval.rag_retriever as rag_retriever
+
+    retriever = {"rag": rag_retriever, "contextual": contextual_retriever}[stage.options["retriever"]]
+    config = {k: v for k, v in stage.params.items() if k != "bm25"}
+    chunks_path, embeddings_path = stage.inputs
+    retriever.build(config, input_path=chunks_path, index_path=stage.options["index_path"],
+                    docs_path=stage.options["docs_path"], bm25_path=stage.options["bm25_path"],
+                    bm25=stage.params["bm25"], embeddings=np.load(embeddings_path, mmap_mode="r"))
+
+
+def run_evaluate(stage):
+    from src.evaluation.evaluator import run
+
+    targets = [(label, paths["index"], paths["docs"]) for label, paths in stage.options["targets"].items()]
+    results = run(targets, stage.options["eval_path"], stage.params["model"], stage.params["k"])
+    with open(stage.outputs[0], "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def index_outputs(index_path, docs_path, bm25_path, params):
+    from src.retrieval.doc_store import store_path
+
+    outputs = [Path(str(index_path) + ".shards.json") if params["shards"] > 1 else index_path,
+               docs_path, store_path(docs_path)]
+    return outputs + [bm25_path] if params["bm25"] else outputs
+
+
+def define_stages(params=DEFAULT_PARAMS, workers=None, concurrency=8):
+    """The split → chunk → contextualize → embed → index → evaluate DAG."""
+    combined = input_path(PROCESSED / "combined.jsonl")
+    train_posts = output_path(PROCESSED / "train_questions.jsonl")
+    eval_posts = output_path(PROCESSED / "eval_questions_raw.jsonl")
+    chunked_train = output_path(PROCESSED / "chunked_documents_train.jsonl")
+    chunked_eval = output_path(PROCESSED / "chunked_documents_eval.jsonl")
+    eval_questions = PROCESSED / "eval_questions.jsonl"
+    contextual = PROCESSED / "chunked_contextual_train.jsonl"   # always JSONL: resuming appends
+    dead_letter = PROCESSED / "chunked_contextual_train.failed.jsonl"
+    targets = {
+        "rag": {"chunks": chunked_train, "index": PROCESSED / "faiss_rag.index",
+                "docs": PROCESSED / "rag_docs.jsonl", "bm25": PROCESSED / "bm25_rag"},
+        "contextual": {"chunks": contextual, "index": PROCESSED / "faiss_contextual.index",
+                       "docs": PROCESSED / "contextual_docs.jsonl", "bm25": PROCESSED / "bm25_contextual"},
+    }
+
+    chunk_params = dict(params["chunk"])
+    if chunk_params["size"] is None:
+        chunk_params["size"] = TOKEN_CHUNK_SIZE if chunk_params["unit"] == "tokens" else CHUNK_SIZE
+    if not 0 <= chunk_params["overlap"] < chunk_params["size"]:
+        raise ValueError(f"chunk.overlap must be at least 0 and smaller than chunk.size "
+                         f"({chunk_params['size']}), got {chunk_params['overlap']}")
+    # int8 ONNX vectors differ from torch ones, so the backend is part of the embedding
+    embed_params = dict(params["embed"], backend=resolve_backend())
+
+    stages = [
+        Stage("split", run_split, [combined], [train_posts, eval_posts], params["split"],
+              code=[SRC / "data_preparation/split_questions_before_chunking.py",
+                    SRC / "data_preparation/splitting.py"]),
+        Stage("chunk", run_chunk, [train_posts, eval_posts], [chunked_train, chunked_eval], chunk_params,
+              code=[SRC / "data_preparation/chunk_documents.py", SRC / "text_utils.py"],
+              options={"workers": workers or os.cpu_count() or 1}),
+        Stage("eval_questions", run_eval_questions, [chunked_eval], [eval_questions],
+              code=[SRC / "data_preparation/generate_eval_questions.py"]),
+        Stage("contextualize", run_contextualize, [chunked_train], [contextual, dead_letter],
+              params["contextualize"], code=[SRC / "data_preparation/chunk_documents_contextual.py"],
+              options={"concurrency": concurrency}, resumable=True),
+    ]
+    for name, paths in targets.items():
+        embeddings = PROCESSED / f"embeddings_{name}.npy"
+        stages.append(Stage(f"embed_{name}", run_embed, [paths["chunks"]], [embeddings], embed_params,
+                            code=[SRC / "retrieval/embedding_backend.py"], options={"cache": name}))
+        stages.append(Stage(f"index_{name}", run_index, [paths["chunks"], embeddings],
+                            index_outputs(paths["index"], paths["docs"], paths["bm25"], params["index"]),
+                            params["index"],
+                            code=[SRC / f"retrieval/{name}_retriever.py", SRC / "retrieval/index_factory.py",
+                                  SRC / "retrieval/sharding.py", SRC / "retrieval/bm25.py",
+                                  SRC / "retrieval/doc_store.py"],
+                            options={"retriever": name, "index_path": paths["index"],
+                                     "docs_path": paths["docs"], "bm25_path": paths["bm25"]}))
+    stages.append(Stage("evaluate", run_evaluate,
+                        [eval_questions] + [p for s in stages if s.name.startswith("index_") for p in s.outputs],
+                        [PROCESSED / "retrieval_eval.json"],
+                        dict(params["evaluate"], model=params["embed"]["model"]),
+                        code=[SRC / "evaluation/evaluator.py"],
+                        options={"eval_path": eval_questions,
+                                 "targets": {"RAG": targets["rag"], "Contextual": targets["contextual"]}}))
+    return stages
+
+
+# === CLI ===
+def merge_params(base, overrides):
+    params = copy.deepcopy(base)
+    for stage, values in overrides.items():
+        if stage not in params:
+            raise KeyError(f"Unknown parameter group {stage!r} (expected one of {list(params)})")
+        params[stage].update(values)
+    return params
+
+
+def parse_set(assignments):
+    """``["chunk.size=500", "split.salt=eval-v2"]`` → nested overrides; values parse as JSON when they can."""
+    overrides = {}
+    for assignment in assignments:
+        key, _, value = assignment.partition("=")
+        stage, _, param = key.partition(".")
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        overrides.setdefault(stage, {})[param] = value
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the data pipeline, rebuilding only stale stages.")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date (default: all).")
+    parser.add_argument("--config", type=Path, help="JSON file of parameter overrides, grouped by stage.")
+    parser.add_argument("--set", action="append", default=[], metavar="GROUP.PARAM=VALUE",
+                        help="Override one parameter, e.g. --set chunk.size=500. Repeatable.")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE",
+                        help="Rebuild this stage even if it is up to date. Repeatable.")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would be rebuilt and why.")
+    parser.add_argument("--list", action="store_true", help="List stages with their inputs and outputs.")
+    parser.add_argument("--workers", type=int, help="Chunking processes (default: all cores).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent Ollama requests when contextualizing.")
+    parser.add_argument("--state", type=Path, default=STATE_PATH)
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    for stage, values in parse_set(args.set).items():
+        overrides.setdefault(stage, {}).update(values)
+    params = merge_params(DEFAULT_PARAMS, overrides)
+
+    try:
+        stages = define_stages(params, args.workers, args.concurrency)
+    except ValueError as e:
+        parser.error(str(e))
+    pipeline = Pipeline(stages, args.state)
+    if args.list:
+        for stage in pipeline.stages.values():
+            print(f"{stage.name}: {', '.join(rel(p) for p in stage.inputs)} → {', '.join(rel(p) for p in stage.outputs)}")
+        return
+    unknown = set(args.force) - set(pipeline.stages)
+    if unknown:
+        parser.error(f"unknown stages for --force: {sorted(unknown)}")
+    try:
+        pipeline.run(args.targets or None, set(args.force), args.dry_run)
+    except StageIncomplete as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
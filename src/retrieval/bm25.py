@@ -0,0 +1,160 @@
+# src/retrieval/bm25.py
+
+import json
+import math
+import re
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+K1 = 1.2
+B = 0.75
+
+# Identifiers such as ``np.linalg.norm``, ``ValueError`` or ``max_seq_length``
+# are kept whole, and their dotted / underscored parts are indexed as well.
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[.:\-][a-z0-9_]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """BM25 inverted index with array-backed, memory-mappable postings.
+
+    Postings are stored CSR-style: ``offsets[t]:offsets[t + 1]`` slices
+    ``doc_ids`` (sorted ascending) and ``impacts``, the precomputed BM25
+    contribution of term ``t`` to each doc. ``max_impact[t]`` is the
+    per-term upper bound used for MaxScore pruning.
+    """
+
+    FILES = ("offsets", "doc_ids", "impacts", "max_impact")
+
+    def __init__(self, vocab, offsets, doc_ids, impacts, max_impact, meta):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.impacts = impacts
+        self.max_impact = max_impact
+        self.meta = meta
+
+    @property
+    def num_docs(self):
+        return self.meta["num_docs"]
+
+    @classmethod
+    def build(cls, texts, k1=K1, b=B):
+        vocab = {}
+        term_col, doc_col, tf_col = array("I"), array("I"), array("I")
+        doc_lens = array("I")
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lens.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                term = vocab.setdefault(token, len(vocab))
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                term_col.append(term)
+                doc_col.append(doc_id)
+                tf_col.append(tf)
+
+        terms = np.frombuffer(term_col, dtype=np.uint32)
+        order = np.argsort(terms, kind="stable")  # docs stay ascending per term
+        terms = terms[order]
+        doc_ids = np.frombuffer(doc_col, dtype=np.uint32)[order].astype(np.int32)
+        tfs = np.frombuffer(tf_col, dtype=np.uint32)[order].astype(np.float32)
+        lens = np.frombuffer(doc_lens, dtype=np.uint32).astype(np.float32)
+
+        num_docs = len(lens)
+        avgdl = float(lens.mean()) if num_docs else 0.0
+        df = np.bincount(terms, minlength=len(vocab)).astype(np.float64)
+        idf = np.log(1.0 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * lens[doc_ids] / max(avgdl, 1e-9))
+        impacts = (idf[terms] * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=offsets[1:])
+        max_impact = np.zeros(len(vocab), dtype=np.float32)
+        if len(impacts):
+            np.maximum.at(max_impact, terms, impacts)
+
+        meta = {"num_docs": num_docs, "avgdl": avgdl, "k1": k1, "b": b}
+        return cls(vocab, offsets, doc_ids, impacts, max_impact, meta)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.FILES:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(directory / "vocab.json", "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+        with open(directory / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        directory = Path(directory)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r" if mmap else None)
+                  for name in cls.FILES}
+        with open(directory / "vocab.json", "r", encoding="utf-8") as f:
+            vocab = {term: i for i, term in enumerate(json.load(f))}
+        with open(directory / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(vocab, meta=meta, **arrays)
+
+    def postings(self, term_id):
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_ids[start:end], self.impacts[start:end]
+
+    def search(self, query, k=10):
+        """Top-``k`` ``(doc_ids, scores)`` with MaxScore-style pruning.
+
+        Terms are visited by decreasing upper bound. Once the bound of the
+        remaining terms cannot lift an unseen doc past the current k-th
+        score, those terms stop adding candidates: their postings are only
+        probed (binary search) for docs that can still make the top k.
+        """
+        term_ids = list(dict.fromkeys(self.vocab[t] for t in tokenize(query) if t in self.vocab))
+        if not term_ids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        term_ids.sort(key=lambda t: -self.max_impact[t])
+        bounds = np.array([self.max_impact[t] for t in term_ids], dtype=np.float64)
+        remaining = np.cumsum(bounds[::-1])[::-1]  # remaining[i] = sum(bounds[i:])
+
+        cand_ids = np.empty(0, dtype=np.int64)
+        cand_scores = np.empty(0, dtype=np.float64)
+        for i, term in enumerate(term_ids):
+            docs, impacts = self.postings(term)
+            theta = np.partition(cand_scores, -k)[-k] if len(cand_scores) >= k else -math.inf
+
+            if remaining[i] <= theta:
+                # Non-essential term: only existing candidates can still win.
+                keep = cand_scores + remaining[i] >= theta
+                cand_ids, cand_scores = cand_ids[keep], cand_scores[keep]
+                pos = np.minimum(np.searchsorted(docs, cand_ids), len(docs) - 1)
+                match = docs[pos] == cand_ids
+                cand_scores[match] += impacts[pos[match]]
+            else:
+                merged_ids = np.concatenate([cand_ids, docs.astype(np.int64)])
+                merged_scores = np.concatenate([cand_scores, impacts.astype(np.float64)])
+                cand_ids, inverse = np.unique(merged_ids, return_inverse=True)
+                cand_scores = np.bincount(inverse, weights=merged_scores)
+
+        if len(cand_ids) > k:
+            top = np.argpartition(-cand_scores, k - 1)[:k]
+            cand_ids, cand_scores = cand_ids[top], cand_scores[top]
+        order = np.lexsort((cand_ids, -cand_scores))
+        return cand_ids[order], cand_scores[order].astype(np.float32)
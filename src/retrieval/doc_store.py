@@ -0,0 +1,166 @@
+# src/retrieval/doc_store.py
+
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"RVCDOCS1"
+HEADER = struct.Struct("<8sQQQ")  # magic, count, meta blob bytes, text blob bytes
+TEXT_KEY = "text"
+
+# File layout (little-endian):
+#   header | meta offsets (count+1 x u64) | text offsets (count+1 x u64)
+#   | meta blob (compact JSON per row, without text) | text blob (UTF-8)
+
+
+def store_path(docs_path):
+    """Binary store written next to a ``*_docs.jsonl`` file."""
+    return Path(docs_path).with_suffix(".bin")
+
+
+def write_doc_store(path, records, text_key=TEXT_KEY):
+    """Stream ``records`` (dicts) into a doc store at ``path``.
+
+    Blobs are spooled to temporary files so memory stays bounded by the
+    offset tables (16 bytes per row).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    meta_offsets, text_offsets = array("Q", [0]), array("Q", [0])
+
+    with tempfile.TemporaryFile() as meta_blob, tempfile.TemporaryFile() as text_blob:
+        for record in records:
+            fields = {k: v for k, v in record.items() if k != text_key}
+            meta_blob.write(json.dumps(fields, separators=(",", ":")).encode("utf-8"))
+            text_blob.write((record.get(text_key) or "").encode("utf-8"))
+            meta_offsets.append(meta_blob.tell())
+            text_offsets.append(text_blob.tell())
+
+        count = len(meta_offsets) - 1
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as out:
+            out.write(HEADER.pack(MAGIC, count, meta_offsets[-1], text_offsets[-1]))
+            out.write(meta_offsets.tobytes())
+            out.write(text_offsets.tobytes())
+            for blob in (meta_blob, text_blob):
+                blob.seek(0)
+                shutil.copyfileobj(blob, out)
+        tmp.replace(path)
+    return count
+
+
+class Doc(Mapping):
+    """One row of a :class:`DocStore`, decoded on first access.
+
+    Reading ``doc["id"]`` only parses the small JSON field record; the text
+    is decoded when ``doc["text"]`` is requested.
+    """
+
+    __slots__ = ("_store", "_row", "_fields", "_text")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+        self._fields = None
+        self._text = None
+
+    @property
+    def row(self):
+        return self._row
+
+    def _meta(self):
+        if self._fields is None:
+            self._fields = self._store.fields(self._row)
+        return self._fields
+
+    def __getitem__(self, key):
+        if key == self._store.text_key:
+            if self._text is None:
+                self._text = self._store.text(self._row)
+            return self._text
+        return self._meta()[key]
+
+    def __iter__(self):
+        yield from self._meta()
+        yield self._store.text_key
+
+    def __len__(self):
+        return len(self._meta()) + 1
+
+    def to_dict(self):
+        return dict(self)
+
+    def __repr__(self):
+        return f"Doc(row={self._row}, {self._meta()!r})"
+
+
+class DocStore:
+    """Memory-mapped, read-only metadata store with O(1) lookup by row ID."""
+
+    def __init__(self, path, text_key=TEXT_KEY):
+        self.path = Path(path)
+        self.text_key = text_key
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, meta_len, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a doc store (bad magic {magic!r})")
+        self._count = count
+        pos = HEADER.size
+        self._meta_offsets = np.frombuffer(self._mm, dtype="<u8", count=count + 1, offset=pos)
+        pos += 8 * (count + 1)
+        self._text_offsets = np.frombuffer(self._mm, dtype="<u8", count=count + 1, offset=pos)
+        pos += 8 * (count + 1)
+        self._meta_base = pos
+        self._text_base = pos + meta_len
+
+    def __len__(self):
+        return self._count
+
+    def _row(self, i):
+        # No negative wrap-around: FAISS pads missing results with -1.
+        i = int(i)
+        if not 0 <= i < self._count:
+            raise IndexError(f"row {i} out of range for {self._count} docs")
+        return i
+
+    def fields(self, i):
+        """Decode the non-text fields of row ``i``."""
+        i = self._row(i)
+        start, end = int(self._meta_offsets[i]), int(self._meta_offsets[i + 1])
+        return json.loads(self._mm[self._meta_base + start:self._meta_base + end])
+
+    def text(self, i):
+        """Decode the text of row ``i``."""
+        i = self._row(i)
+        start, end = int(self._text_offsets[i]), int(self._text_offsets[i + 1])
+        return self._mm[self._text_base + start:self._text_base + end].decode("utf-8")
+
+    def __getitem__(self, i):
+        return Doc(self, self._row(i))
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield Doc(self, i)
+
+    def close(self):
+        self._meta_offsets = self._text_offsets = None
+        self._mm.close()
+        self._file.close()
+
+
+def load_docs(docs_path):
+    """Open the binary store for ``docs_path`` if present, else parse the JSONL."""
+    bin_path = store_path(docs_path)
+    if bin_path.exists():
+        return DocStore(bin_path)
+    with open(docs_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
@@ -0,0 +1,305 @@
+# src/retrieval/embedding_backend.py
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+BASE_PATH = Path(__file__).resolve().parent.parent.parent
+MODELS_DIR = BASE_PATH / "data/models"
+SAMPLE_PATH = BASE_PATH / "data/processed/chunked_documents_train.jsonl"
+
+EMBED_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+ONNX_OPSET = 14
+PARITY_MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.98}  # worst row vs. torch
+PARITY_SAMPLES = 512
+
+
+def resolve_backend(backend=None):
+    backend = backend or os.environ.get("EMBED_BACKEND", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend!r} (expected one of {BACKENDS})")
+    return backend
+
+
+def onnx_dir(model_name=EMBED_MODEL_NAME):
+    """Exported model directory, ``data/models/<model>-onnx/`` by default."""
+    override = os.environ.get("EMBED_ONNX_DIR")
+    return Path(override) if override else MODELS_DIR / f"{model_name.split('/')[-1]}-onnx"
+
+
+def encoder_id(model_name=EMBED_MODEL_NAME, backend=None):
+    """Embedding-cache namespace; int8 vectors must not mix with torch ones."""
+    backend = resolve_backend(backend)
+    return model_name if backend == "torch" else f"{model_name}#{backend}"
+
+
+class OnnxEncoder:
+    """ONNX Runtime replacement for ``SentenceTransformer.encode``.
+
+    Runs the exported transformer, then applies the same mean pooling and
+    (if the model has one) normalization layer. Only needs ``onnxruntime``
+    and ``tokenizers``, so PyTorch is never imported.
+    """
+
+    def __init__(self, model_dir, quantized=False, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / "encoder.json", "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.normalize = self.config["normalize"]
+        self.dim = self.config["dim"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        path = model_dir / ONNX_FILES["onnx-int8" if quantized else "onnx"]
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self.input_names})[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=False, **_):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        out = np.empty((len(sentences), self.dim), dtype=np.float32)
+        # Length-sorted batches keep padding short, as sentence-transformers does.
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        starts = range(0, len(sentences), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            starts = tqdm(starts, desc="Batches")
+        for start in starts:
+            rows = order[start:start + batch_size]
+            out[rows] = self._encode_batch([sentences[i] for i in rows])
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+
+def load_encoder(model_name=EMBED_MODEL_NAME, backend=None):
+    """Encoder for ``backend`` (``EMBED_BACKEND``, default ``torch``)."""
+    backend = resolve_backend(backend)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    model_dir = onnx_dir(model_name)
+    if not (model_dir / ONNX_FILES[backend]).exists():
+        raise FileNotFoundError(f"No exported {backend} model in {model_dir}; "
+                                f"run: python src/retrieval/embedding_backend.py export")
+    return OnnxEncoder(model_dir, quantized=backend == "onnx-int8")
+
+
+# === Export ===
+def export_onnx(model_name=EMBED_MODEL_NAME, out_dir=None, quantize=True, opset=ONNX_OPSET):
+    """Export the transformer to ONNX, plus a dynamically int8-quantized copy."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    out_dir = Path(out_dir or onnx_dir(model_name))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    pooling = next((m for m in st_model if isinstance(m, Pooling)), None)
+    if pooling is None or pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"{model_name} does not use mean pooling; only mean-pooled models can be exported")
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    hf_model = transformer.auto_model.eval()
+
+    sample = tokenizer(["an export sample sentence"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Transformer(torch.nn.Module):
+        def forward(self, *inputs):
+            return hf_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Transformer(), tuple(sample[n] for n in input_names), str(out_dir / ONNX_FILES["onnx"]),
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes={name: axes for name in input_names + ["last_hidden_state"]},
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(str(out_dir))
+    with open(out_dir / "encoder.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "dim": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length,
+            "normalize": any(isinstance(m, Normalize) for m in st_model),
+            "pad_token": tokenizer.pad_token,
+            "pad_id": tokenizer.pad_token_id,
+        }, f, indent=2)
+    print(f"✅ Exported {model_name} to {out_dir / ONNX_FILES['onnx']}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out_dir / ONNX_FILES["onnx"]), str(out_dir / ONNX_FILES["onnx-int8"]),
+                         weight_type=QuantType.QInt8)
+        print(f"✅ Quantized to {out_dir / ONNX_FILES['onnx-int8']}")
+    return out_dir
+
+
+# === Parity and throughput ===
+def sample_texts(n=PARITY_SAMPLES, path=SAMPLE_PATH):
+    """Real chunks when the chunked corpus exists, else generated text."""
+    texts = []
+    if Path(path).exists():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                texts.append(json.loads(line)["chunk"])
+                if len(texts) >= n:
+                    break
+    if not texts:
+        words = "index vector query model search error cache latency token answer chunk batch".split()
+        rng = np.random.default_rng(0)
+        texts = [" ".join(rng.choice(words, rng.integers(5, 120))) for _ in range(n)]
+    return texts
+
+
+def parity_report(texts, backends=("onnx", "onnx-int8"), model_name=EMBED_MODEL_NAME, k=5):
+    """Per-row cosine to the torch embeddings and top-``k`` neighbour overlap."""
+    reference = load_encoder(model_name, "torch").encode(texts, batch_size=64, convert_to_numpy=True)
+    ref_norm = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    ref_top = np.argsort(-ref_norm @ ref_norm.T, axis=1)[:, 1:k + 1]
+
+    rows = []
+    for backend in backends:
+        vecs = load_encoder(model_name, backend).encode(texts, batch_size=64)
+        norm = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+        cosine = (norm * ref_norm).sum(axis=1)
+        top = np.argsort(-norm @ norm.T, axis=1)[:, 1:k + 1]
+        overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(top, ref_top)])
+        rows.append({
+            "backend": backend,
+            "min_cosine": float(cosine.min()),
+            "mean_cosine": float(cosine.mean()),
+            f"neighbour_overlap_at_{k}": float(overlap),
+            "ok": bool(cosine.min() >= PARITY_MIN_COSINE[backend]),
+        })
+    return rows
+
+
+def bench_backend(backend, batch_sizes, n_texts, model_name=EMBED_MODEL_NAME):
+    """Cold start, throughput and RSS for one backend, measured in-process."""
+    import resource
+
+    start = time.perf_counter()
+    model = load_encoder(model_name, backend)
+    model.encode(["warm-up"])
+    load_s = time.perf_counter() - start
+
+    texts = sample_texts(n_texts)
+    row = {"backend": backend, "load_s": load_s}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        row[f"texts_per_s@{batch_size}"] = len(texts) / (time.perf_counter() - start)
+    latencies = []
+    for text in texts[:100]:
+        start = time.perf_counter()
+        model.encode([text])
+        latencies.append((time.perf_counter() - start) * 1000)
+    row["query_p50_ms"] = float(np.percentile(latencies, 50))
+    row["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return row
+
+
+def bench(backends, batch_sizes, n_texts, model_name=EMBED_MODEL_NAME):
+    """Each backend runs in a fresh interpreter so import cost and RSS are its own."""
+    rows = []
+    for backend in backends:
+        cmd = [sys.executable, os.path.abspath(__file__), "--model", model_name, "bench-one", "--backend", backend,
+               "--texts", str(n_texts), "--batch-sizes", *map(str, batch_sizes)]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"⚠️ {backend} failed:\n{result.stderr.strip()[-500:]}")
+            continue
+        rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return rows
+
+
+def print_rows(rows):
+    for row in rows:
+        print("  " + ", ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, check and benchmark embedding backends.")
+    parser.add_argument("--model", default=EMBED_MODEL_NAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Export the model to ONNX (and int8).")
+    export.add_argument("--out-dir", type=Path)
+    export.add_argument("--no-quantize", action="store_true")
+
+    check = sub.add_parser("check", help="Compare ONNX embeddings with PyTorch.")
+    check.add_argument("--samples", type=int, default=PARITY_SAMPLES)
+    check.add_argument("--backends", nargs="+", choices=BACKENDS[1:], default=list(BACKENDS[1:]))
+
+    bench_parser = sub.add_parser("bench", help="Throughput, cold start and RSS per backend.")
+    one = sub.add_parser("bench-one")  # used by ``bench`` in a child process
+    one.add_argument("--backend", choices=BACKENDS, required=True)
+    for p in (bench_parser, one):
+        p.add_argument("--texts", type=int, default=512)
+        p.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 32, 128])
+    bench_parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model, args.out_dir, quantize=not args.no_quantize)
+    elif args.command == "check":
+        rows = parity_report(sample_texts(args.samples), args.backends, args.model)
+        print("Parity against PyTorch:")
+        print_rows(rows)
+        if not all(r["ok"] for r in rows):
+            sys.exit("❌ Parity check failed")
+        print("✅ Parity check passed")
+    elif args.command == "bench":
+        print("Embedding backends:")
+        print_rows(bench(args.backends, args.batch_sizes, args.texts, args.model))
+    elif args.command == "bench-one":
+        print(json.dumps(bench_backend(args.backend, args.batch_sizes, args.texts, args.model)))
+
+
+if __name__ == "__main__":
+    main()
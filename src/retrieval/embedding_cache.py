@@ -0,0 +1,217 @@
+# src/retrieval/embedding_cache.py
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DIR = (
+    Path(__file__).resolve().parent.parent.parent
+    / "data/processed/embedding_cache"
+)
+
+KEY_BYTES = 16
+STALE_RATIO = 0.2  # compact once this share of entries is unused by a build
+
+
+def content_key(model_name, text):
+    """Content address of one chunk embedding: hash of (model name, text)."""
+    h = hashlib.blake2b(digest_size=KEY_BYTES)
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+def _pack_keys(keys):
+    # Stored as raw uint8 rows: numpy "S" dtypes strip trailing NUL bytes.
+    return np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, KEY_BYTES)
+
+
+def _unpack_keys(packed):
+    raw = packed.tobytes()
+    return [raw[i:i + KEY_BYTES] for i in range(0, len(raw), KEY_BYTES)]
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by hash of (model name, chunk text).
+
+    Vectors live in a raw float32 file that is memory-mapped on load, and
+    ``keys.npy`` holds one 16-byte key per vector row. Only chunks whose key
+    is missing are sent to the model; everything else is read from the map.
+
+    Compaction writes both files as a new generation and then switches
+    ``meta.json`` to it with one atomic rename, so a crash leaves either
+    the old pair or the new one, never new vectors under old keys.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, model_name=""):
+        self.dir = Path(cache_dir)
+        self.model_name = model_name
+        self.meta_path = self.dir / "meta.json"
+        self.generation = 0
+        self.dim = None
+        self.keys = np.empty((0, KEY_BYTES), dtype=np.uint8)
+        self.vectors = None
+        self.row_of = {}
+        self.touched = set()
+        self.last_keys = []
+        self._load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _paths(self, generation):
+        suffix = f".{generation}" if generation else ""  # generation 0 keeps the original names
+        return self.dir / f"vectors{suffix}.f32", self.dir / f"keys{suffix}.npy"
+
+    @property
+    def vectors_path(self):
+        return self._paths(self.generation)[0]
+
+    @property
+    def keys_path(self):
+        return self._paths(self.generation)[1]
+
+    def _load(self):
+        if not self.meta_path.exists():
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.generation = meta.get("generation", 0)
+        if not self.keys_path.exists():
+            return
+        self.keys = np.load(self.keys_path)
+        self.row_of = {k: i for i, k in enumerate(_unpack_keys(self.keys))}
+        self._map()
+
+    def _map(self):
+        # keys.npy is written after the vectors, so it defines how many rows
+        # are valid; trailing bytes from an interrupted append are ignored.
+        n = len(self.keys)
+        if n == 0:
+            self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+            return
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    def _write_keys(self, path):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npy")
+        np.save(tmp, self.keys)
+        os.replace(tmp, path)
+
+    def _write_meta(self):
+        tmp = self.meta_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "model_name": self.model_name, "count": len(self.keys),
+                       "generation": self.generation}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _write_index(self):
+        self._write_keys(self.keys_path)
+        self._write_meta()
+
+    def _append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {vectors.shape[1]} does not match cache dim {self.dim}")
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.vectors_path, "r+b" if self.vectors_path.exists() else "wb") as f:
+            f.seek(len(self.keys) * self.dim * 4)
+            f.write(vectors.tobytes())
+            f.truncate()
+
+        start = len(self.keys)
+        self.keys = np.concatenate([self.keys, _pack_keys(keys)])
+        for i, k in enumerate(keys, start):
+            self.row_of[k] = i
+        self._write_index()
+        self._map()
+
+    def embed(self, texts, model, batch_size=64, show_progress_bar=True):
+        """Return embeddings for ``texts``, encoding only uncached chunks."""
+        keys = [content_key(self.model_name, t) for t in texts]
+        self.touched.update(keys)
+        self.last_keys = keys
+
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in self.row_of and k not in missing:
+                missing[k] = t
+
+        if missing:
+            print(f"Embedding cache: {len(texts) - len(missing)} hits, encoding {len(missing)} new chunks...")
+            new_vecs = model.encode(
+                list(missing.values()),
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True,
+            )
+            self._append(list(missing.keys()), new_vecs)
+        else:
+            print(f"Embedding cache: all {len(texts)} chunks cached.")
+
+        if not keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+
+        rows = np.fromiter((self.row_of[k] for k in keys), dtype=np.int64, count=len(keys))
+        # A build whose chunks are stored contiguously and in order (e.g. an
+        # unchanged corpus after compaction) gets a view over the map.
+        if np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows))):
+            return self.vectors[rows[0]:rows[0] + len(rows)]
+        return self.vectors[rows]
+
+    def stale_count(self):
+        return len(self.keys) - len(self.touched & self.row_of.keys())
+
+    def compact(self, keep=None):
+        """Rewrite the cache keeping only ``keep`` keys (default: touched ones).
+
+        Entries are written in the order they were last requested, so an
+        unchanged rebuild afterwards reads one contiguous slice.
+        """
+        keep = self.touched if keep is None else set(keep)
+        candidates = self.last_keys + _unpack_keys(self.keys)
+        order = [k for k in dict.fromkeys(candidates) if k in keep and k in self.row_of]
+        if len(order) == len(self.keys) and all(self.row_of[k] == i for i, k in enumerate(order)):
+            return 0
+
+        removed = len(self.keys) - len(order)
+        rows = np.fromiter((self.row_of[k] for k in order), dtype=np.int64, count=len(order))
+        self.dir.mkdir(parents=True, exist_ok=True)
+        generation = self.generation + 1
+        vectors_path, keys_path = self._paths(generation)
+        with open(vectors_path, "wb") as f:
+            for start in range(0, len(rows), 65536):
+                f.write(np.ascontiguousarray(self.vectors[rows[start:start + 65536]]).tobytes())
+        self.vectors = None
+
+        self.keys = _pack_keys(order) if order else np.empty((0, KEY_BYTES), dtype=np.uint8)
+        self.row_of = {k: i for i, k in enumerate(order)}
+        self._write_keys(keys_path)
+        self.generation = generation
+        self._write_meta()  # commit point: readers switch to the new pair here
+        self._remove_other_generations()
+        self._map()
+        return removed
+
+    def _remove_other_generations(self):
+        current = set(self._paths(self.generation))
+        for path in list(self.dir.glob("vectors*.f32")) + list(self.dir.glob("keys*.npy")):
+            if path not in current:
+                path.unlink(missing_ok=True)
+
+    def evict_stale(self, max_stale_ratio=STALE_RATIO):
+        """Compact when too many entries were not used by the current build."""
+        stale = self.stale_count()
+        if len(self.keys) and stale / len(self.keys) > max_stale_ratio:
+            removed = self.compact()
+            print(f"Embedding cache: compacted, removed {removed} stale entries.")
+            return removed
+        return 0
@@ -0,0 +1,20 @@
+# src/retrieval/hybrid.py
+
+RRF_K = 60  # rank constant from the original RRF paper
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, limit=None):
+    """Fuse ranked lists of row IDs: score(d) = sum(1 / (k + rank(d))).
+
+    ``rankings`` are iterables of row IDs, best first; negative IDs (FAISS
+    padding) are ignored. Returns fused row IDs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            row = int(row)
+            if row < 0:
+                continue
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=lambda row: (-scores[row], row))
+    return fused[:limit] if limit is not None else fused
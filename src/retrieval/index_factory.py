@@ -0,0 +1,317 @@
+# src/retrieval/index_factory.py
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+VECTOR_DTYPES = ("float32", "fp16", "int8")
+VECTOR_CODECS = {"float32": "Flat", "fp16": "SQfp16", "int8": "SQ8"}  # FAISS factory codes
+
+# Build-time parameters
+DEFAULT_NLIST = 1024        # IVF coarse clusters
+DEFAULT_PQ_M = 48           # PQ sub-quantizers (must divide the embedding dim)
+DEFAULT_PQ_NBITS = 8        # bits per PQ code
+DEFAULT_HNSW_M = 32         # HNSW graph degree
+DEFAULT_EF_CONSTRUCTION = 200
+
+# Search-time parameters
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+
+MIN_POINTS_PER_CENTROID = 39   # below this FAISS k-means warns and degrades
+MAX_TRAIN_POINTS_PER_CENTROID = 256
+MIN_TRAIN_POINTS = 65536       # PQ codebooks need ~39 * 2**nbits points
+
+
+def sidecar_path(index_path):
+    """Index config is stored next to the index as ``<index>.json``."""
+    return Path(str(index_path) + ".json")
+
+
+def vectors_path(index_path):
+    """Optional float32 vector sidecar, ``<index>.vectors.npy``."""
+    return Path(str(index_path) + ".vectors.npy")
+
+
+def add_index_args(parser):
+    """Register index-factory options on an argparse parser."""
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, default=DEFAULT_NLIST)
+    parser.add_argument("--pq-m", type=int, default=DEFAULT_PQ_M)
+    parser.add_argument("--pq-nbits", type=int, default=DEFAULT_PQ_NBITS)
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--normalize", action="store_true",
+                        help="L2-normalize vectors and search by inner product (cosine).")
+    parser.add_argument("--vector-dtype", choices=VECTOR_DTYPES, default="float32",
+                        help="Stored vector precision; fp16/int8 use scalar quantization.")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the corpus into this many contiguous index shards.")
+    return parser
+
+
+def config_from_args(args):
+    return {
+        "index_type": args.index_type,
+        "nlist": args.nlist,
+        "pq_m": args.pq_m,
+        "pq_nbits": args.pq_nbits,
+        "hnsw_m": args.hnsw_m,
+        "ef_construction": args.ef_construction,
+        "nprobe": args.nprobe,
+        "ef_search": args.ef_search,
+        "normalize": args.normalize,
+        "vector_dtype": args.vector_dtype,
+        "shards": args.shards,
+    }
+
+
+def effective_nlist(n_vectors, nlist):
+    """Clamp nlist so every centroid gets enough training points."""
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def factory_string(index_type, dim, n_vectors, nlist=DEFAULT_NLIST, pq_m=DEFAULT_PQ_M,
+                   pq_nbits=DEFAULT_PQ_NBITS, hnsw_m=DEFAULT_HNSW_M, normalize=False,
+                   vector_dtype="float32", **_):
+    """FAISS factory string; ``normalize`` prepends an ``L2norm`` transform
+    so queries are normalized by the index itself."""
+    if vector_dtype not in VECTOR_CODECS:
+        raise ValueError(f"Unknown vector dtype: {vector_dtype!r} (expected one of {VECTOR_DTYPES})")
+    codec = VECTOR_CODECS[vector_dtype]
+    prefix = "L2norm," if normalize else ""
+    if index_type == "flat":
+        return prefix + codec
+    if index_type == "ivf_flat":
+        return prefix + f"IVF{effective_nlist(n_vectors, nlist)},{codec}"
+    if index_type == "ivf_pq":
+        if dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+        if vector_dtype != "float32":
+            raise ValueError("ivf_pq already compresses vectors; use vector_dtype='float32'")
+        return prefix + f"IVF{effective_nlist(n_vectors, nlist)},PQ{pq_m}x{pq_nbits}"
+    if index_type == "hnsw":
+        return prefix + f"HNSW{hnsw_m},{codec}"
+    raise ValueError(f"Unknown index type: {index_type!r} (expected one of {INDEX_TYPES})")
+
+
+def metric_type(normalize=False, **_):
+    return faiss.METRIC_INNER_PRODUCT if normalize else faiss.METRIC_L2
+
+
+def needs_vector_sidecar(config):
+    """Whether ``load_vector_lookup`` cannot rely on exact reconstruction."""
+    return (config.get("index_type", "flat") != "flat" or config.get("normalize", False)
+            or config.get("vector_dtype", "float32") != "float32" or config.get("shards", 1) > 1)
+
+
+def apply_search_params(index, nprobe=None, ef_search=None):
+    """Set nprobe / efSearch on whichever sub-index understands them."""
+    space = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # parameter does not apply to this index type
+    return index
+
+
+def _find_hnsw(index):
+    index = faiss.downcast_index(index)
+    while index is not None:
+        if isinstance(index, faiss.IndexHNSW):
+            return index
+        inner = getattr(index, "index", None)
+        index = faiss.downcast_index(inner) if inner is not None else None
+    return None
+
+
+def build_index(embeddings, index_type="flat", **params):
+    """Build a FAISS index of the requested type over ``embeddings``.
+
+    IVF variants are trained on a sample of the embeddings before adding.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dim = embeddings.shape
+    index = faiss.index_factory(dim, factory_string(index_type, dim, n, **params), metric_type(**params))
+
+    hnsw_index = _find_hnsw(index)
+    if hnsw_index is not None:
+        hnsw_index.hnsw.efConstruction = params.get("ef_construction", DEFAULT_EF_CONSTRUCTION)
+
+    if not index.is_trained:
+        try:
+            nlist = faiss.extract_index_ivf(index).nlist
+        except RuntimeError:
+            nlist = 0  # scalar quantizer only: trains per-dimension ranges
+        max_train = max(nlist * MAX_TRAIN_POINTS_PER_CENTROID, MIN_TRAIN_POINTS)
+        if n > max_train:
+            sample = np.random.default_rng(0).choice(n, max_train, replace=False)
+            index.train(embeddings[np.sort(sample)])
+        else:
+            index.train(embeddings)
+
+    index.add(embeddings)
+    apply_search_params(index, params.get("nprobe", DEFAULT_NPROBE), params.get("ef_search", DEFAULT_EF_SEARCH))
+    return index
+
+
+def save_index(index, path, config=None):
+    """Write the index and its config sidecar."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(index, str(path))
+    with open(sidecar_path(path), "w", encoding="utf-8") as f:
+        json.dump(config or {"index_type": "flat"}, f, indent=2)
+
+
+def load_index_config(path):
+    try:
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"index_type": "flat"}
+
+
+def mmap_flags(config):
+    """FAISS read flags that map the stored vectors instead of copying them.
+
+    IVF inverted lists and flat code arrays need different flags, and the
+    two cannot be combined. ``IO_FLAG_MMAP_IFC`` needs FAISS >= 1.10.
+    """
+    if config.get("index_type", "flat").startswith("ivf"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def load_index(path, nprobe=None, ef_search=None, mmap=None):
+    """Read an index and apply its search parameters.
+
+    Precedence: explicit arguments, then the ``FAISS_NPROBE`` /
+    ``FAISS_EF_SEARCH`` environment variables, then the build sidecar.
+    With ``mmap`` (default: ``FAISS_MMAP=1``) the vectors are memory-mapped
+    read-only, so opening is fast and pages are loaded on first use.
+
+    When a shard manifest exists for ``path`` a ``ShardedSearcher`` is
+    returned instead; ``FAISS_SHARD_MODE`` picks ``process`` (default) or
+    ``local`` nodes.
+    """
+    from src.retrieval import sharding
+
+    if sharding.manifest_path(path).exists():
+        return sharding.ShardedSearcher(
+            path,
+            mode=os.environ.get("FAISS_SHARD_MODE", "process"),
+            timeout_s=float(os.environ.get("FAISS_SHARD_TIMEOUT", sharding.SHARD_TIMEOUT_S)),
+            nprobe=nprobe,
+            ef_search=ef_search,
+            mmap=mmap,
+        )
+
+    if mmap is None:
+        mmap = os.environ.get("FAISS_MMAP", "0") == "1"
+    config = load_index_config(path)
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(str(path), mmap_flags(config))
+        except RuntimeError:
+            pass  # index layout without mmap support: read it into memory
+    if index is None:
+        index = faiss.read_index(str(path))
+
+    if nprobe is None:
+        nprobe = int(os.environ.get("FAISS_NPROBE", config.get("nprobe", DEFAULT_NPROBE)))
+    if ef_search is None:
+        ef_search = int(os.environ.get("FAISS_EF_SEARCH", config.get("ef_search", DEFAULT_EF_SEARCH)))
+    return apply_search_params(index, nprobe, ef_search)
+
+
+def index_fingerprint(*paths):
+    """Short digest of the size and mtime of index and doc-store files.
+
+    Changes whenever one is rebuilt; a sharded index is represented by its
+    manifest. Missing files hash as absent rather than raising.
+    """
+    from src.retrieval import sharding
+
+    files = []
+    for path in paths:
+        if sharding.manifest_path(path).exists():
+            path = sharding.manifest_path(path)
+        try:
+            st = os.stat(path)
+            files.append([str(path), st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            files.append([str(path), None, None])
+    return hashlib.blake2b(json.dumps(files).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def save_vectors(embeddings, index_path, vector_dtype="float32"):
+    """Store raw embeddings by row ID for indexes that cannot return them.
+
+    Compressed indexes get a float16 sidecar; lookups still return float32.
+    """
+    dtype = np.float32 if vector_dtype == "float32" else np.float16
+    np.save(vectors_path(index_path), np.ascontiguousarray(embeddings, dtype=dtype))
+
+
+def _load_sidecar(index_path, ntotal, mmap_mode=None):
+    """The vector sidecar, or None when it is missing or sized for another corpus."""
+    path = vectors_path(index_path)
+    if not path.exists():
+        return None
+    vectors = np.load(path, mmap_mode=mmap_mode)
+    if len(vectors) != ntotal:
+        print(f"⚠️ Ignoring {path}: {len(vectors)} vectors for an index of {ntotal}")
+        return None
+    return vectors
+
+
+def load_corpus_vectors(index_path):
+    """All corpus vectors as float32, from the sidecar or a flat index."""
+    from src.retrieval import sharding
+
+    index = None
+    if sharding.manifest_path(index_path).exists():
+        with open(sharding.manifest_path(index_path), "r", encoding="utf-8") as f:
+            ntotal = json.load(f)["ntotal"]
+    else:
+        index = faiss.read_index(str(index_path))
+        ntotal = index.ntotal
+    vectors = _load_sidecar(index_path, ntotal)
+    if vectors is not None:
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+    if index is None:
+        raise ValueError(f"Sharded index {index_path} has no matching vector sidecar; rebuild it")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def load_vector_lookup(index, index_path):
+    """Return ``lookup(row_ids) -> (n, dim) float32`` for an index.
+
+    Uses the memory-mapped vector sidecar when present and sized for this
+    index, otherwise reconstructs the stored vectors from the index itself.
+    Returns None when neither is possible, e.g. for a ``ShardedSearcher``
+    without a sidecar.
+    """
+    vectors = _load_sidecar(index_path, index.ntotal, mmap_mode="r")
+    if vectors is not None:
+        return lambda ids: np.asarray(vectors[np.asarray(ids, dtype=np.int64)], dtype=np.float32)
+
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass  # not an IVF index; reconstruct works directly
+    except TypeError:
+        return None  # not a FAISS index, so there are no stored vectors to reconstruct
+    return lambda ids: index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
@@ -0,0 +1,95 @@
+# src/retrieval/microbatch.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Group concurrent submissions into one ``process(items)`` call.
+
+    A background thread takes the first waiting item, then keeps
+    collecting until ``max_batch_size`` items or ``max_wait_ms`` have
+    passed, and resolves each caller's future with its slot of the
+    returned list. An exception fails every future in that batch.
+    """
+
+    def __init__(self, process, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, name="microbatch"):
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)  # finish this batch, then stop
+                break
+            batch.append(entry)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [(item, f) for item, f in self._collect(first) if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                results = self.process(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_s * 1000,
+            }
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
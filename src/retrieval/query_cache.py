@@ -0,0 +1,115 @@
+# src/retrieval/query_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional TTL and hit/miss counters.
+
+    ``get_or_compute`` is single-flight: concurrent callers asking for the
+    same missing key wait for one computation instead of repeating it, so
+    two click handlers encoding the same query share one forward pass.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}          # key -> Event set when computed
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _lookup(self, key):
+        # Caller holds the lock.
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        # Caller holds the lock.
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Cached value for ``key``, computed once on a miss.
+
+        A result for which ``cacheable(value)`` is false is returned but
+        not stored, so the next caller computes it again.
+        """
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._inflight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                pending.wait()
+                continue  # re-check; the owner may have failed
+
+            try:
+                value = compute()
+                if cacheable is None or cacheable(value):
+                    with self._lock:
+                        self._store(key, value)
+                return value
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                pending.set()
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -7,11 +7,11 @@ from pathlib import Path
 # Add project root to Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from src.generation.generate_answers import generate_answer
-
-import faiss
-import json
-from sentence_transformers import SentenceTransformer
+from src.generation.generate_answers import stream_answer
+from src.retrieval.embedding_backend import load_encoder
+from src.retrieval.index_factory import load_index
+from src.retrieval.doc_store import load_docs
+from src.retrieval.retrieval_client import RetrievalClient, resolve_url
 
 INDEX_PATH = (
     Path(__file__).resolve().parent.parent.parent
@@ -26,36 +26,51 @@ TOP_K = 10
 OLLAMA_MODEL = "gemma3:latest"  # Or change to llama3.2:latest if needed
 
 def load_documents(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return [json.loads(line) for line in f]
+    return load_docs(path)
 
 def search_index(query, model, index, docs, k=TOP_K):
     query_vec = model.encode([query], convert_to_numpy=True)
     distances, indices = index.search(query_vec, k)
-    results = [docs[i] for i in indices[0]]
-    return results, distances[0]
+    return found(docs, indices[0], distances[0])
+
+def search_remote(query, client, docs, k=TOP_K):
+    distances, ids = client.search(query, "rag", k)
+    return found(docs, ids, distances)
+
+def found(docs, ids, distances):
+    """Docs and distances for ``ids``, skipping FAISS padding (-1)."""
+    keep = ids >= 0
+    return [docs[i] for i in ids[keep]], distances[keep]
 
 def main():
-    print("Loading index and model...")
-    model = SentenceTransformer(EMBED_MODEL_NAME)
-    index = faiss.read_index(str(INDEX_PATH))
     docs = load_documents(DOCS_PATH)
+    server_url = resolve_url()
+    if server_url:
+        print(f"Using retrieval server at {server_url}")
+        client = RetrievalClient(server_url)
+        search = lambda query: search_remote(query, client, docs)
+    else:
+        print("Loading index and model...")
+        model = load_encoder(EMBED_MODEL_NAME)
+        index = load_index(INDEX_PATH)
+        search = lambda query: search_index(query, model, index, docs)
 
     while True:
         query = input("\n🔎 Enter your query (or type 'exit'): ").strip()
         if query.lower() == 'exit':
             break
 
-        results, distances = search_index(query, model, index, docs)
+        results, distances = search(query)
         print(f"\nTop {TOP_K} retrieved chunks:")
         for i, (res, dist) in enumerate(zip(results, distances)):
             print(f"\n#{i+1} | Distance: {dist:.2f}")
             print(res['text'][:300] + "...\n" + "-"*50)
 
         print("\n💡 Generating answer with Ollama...")
-        answer = generate_answer(query, results, model=OLLAMA_MODEL)
         print("\n🧠 Answer:\n")
-        print(answer)
+        for token in stream_answer(query, results, model=OLLAMA_MODEL):
+            print(token, end="", flush=True)
+        print()
 
 if __name__ == '__main__':
     main()
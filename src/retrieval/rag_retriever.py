@@ -1,58 +1,114 @@
 # src/retrieval/rag_retriever.py
 
+import argparse
 import json
 import os
+import shutil
+import sys
 from pathlib import Path
-import faiss
-from sentence_transformers import SentenceTransformer
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.retrieval.embedding_backend import encoder_id, load_encoder
+from src.retrieval.embedding_cache import CACHE_DIR, EmbeddingCache
+from src.retrieval import index_factory, sharding
+from src.retrieval.bm25 import BM25Index
+from src.data_preparation.columnar import input_path, iter_records
+from src.retrieval.doc_store import store_path, write_doc_store
 
 BASE_PATH = Path(__file__).resolve().parent.parent.parent
-INPUT_PATH = BASE_PATH / "data/processed/chunked_documents_train.jsonl"
+INPUT_PATH = input_path(BASE_PATH / "data/processed/chunked_documents_train.jsonl")
+INPUT_COLUMNS = ['id', 'chunk_id', 'chunk', 'source', 'tags', 'label']
 INDEX_PATH = BASE_PATH / "data/processed/faiss_rag.index"
 DOCS_PATH = BASE_PATH / "data/processed/rag_docs.jsonl"
+BM25_PATH = BASE_PATH / "data/processed/bm25_rag"
 
 EMBED_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+USE_EMBEDDING_CACHE = True
+EMBED_CACHE_DIR = CACHE_DIR / "rag"
 
-def embed_chunks(chunks, model):
+def embed_chunks(chunks, model, cache=None):
+    if cache is not None:
+        return cache.embed(chunks, model)
     return model.encode(chunks, show_progress_bar=True, convert_to_numpy=True)
 
-def build_index(embeddings):
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    return index
+def build_index(embeddings, index_type="flat", **params):
+    return index_factory.build_index(embeddings, index_type, **params)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the RAG FAISS index.")
+    index_factory.add_index_args(parser)
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Re-encode every chunk instead of using the embedding cache.")
+    parser.add_argument("--no-bm25", action="store_true", help="Skip building the BM25 sparse index.")
+    return parser.parse_args(argv)
 
-def main():
-    model = SentenceTransformer(EMBED_MODEL_NAME)
+def build(config, input_path=INPUT_PATH, index_path=INDEX_PATH, docs_path=DOCS_PATH, bm25_path=BM25_PATH,
+          use_embedding_cache=USE_EMBEDDING_CACHE, bm25=True, embeddings=None):
+    """Embed the chunks in ``input_path`` and write the index, metadata and BM25 files.
+
+    Pass precomputed ``embeddings`` (one row per chunk, in file order) to
+    skip loading the encoder.
+    """
     chunks, metadata = [], []
 
-    with open(INPUT_PATH, 'r', encoding='utf-8') as f:
-        for line in f:
-            item = json.loads(line)
-            chunks.append(item['chunk'])
-            metadata.append({
-                'id': item.get('id'),
-                'text': item['chunk'],
-                'source': item.get('source', 'unknown'),
-                'tags': item.get('tags', None),
-                'label': item.get('label', None)
-            })
+    for item in iter_records(input_path, columns=INPUT_COLUMNS):
+        chunks.append(item['chunk'])
+        metadata.append({
+            'id': item['id'],
+            'chunk_id': item['chunk_id'] or 0,
+            'text': item['chunk'],
+            'source': item['source'] or 'unknown',
+            'tags': item['tags'],
+            'label': item['label']
+        })
+
+    cache = None
+    if embeddings is None:
+        print(f"Embedding {len(chunks)} chunks...")
+        model = load_encoder(EMBED_MODEL_NAME)
+        cache = EmbeddingCache(EMBED_CACHE_DIR, encoder_id(EMBED_MODEL_NAME)) if use_embedding_cache else None
+        embeddings = embed_chunks(chunks, model, cache)
+    elif len(embeddings) != len(chunks):
+        raise ValueError(f"{len(embeddings)} embeddings for {len(chunks)} chunks in {input_path}")
 
-    print(f"Embedding {len(chunks)} chunks...")
-    embeddings = embed_chunks(chunks, model)
+    if config["shards"] > 1:
+        print(f"Building {config['shards']} FAISS {config['index_type']} shards...")
+        sharding.build_shards(embeddings, index_path, config["shards"], config)
+    else:
+        print(f"Building FAISS {config['index_type']} index...")
+        index = build_index(embeddings, **config)
+        index_factory.save_index(index, index_path, config)
+        sharding.manifest_path(index_path).unlink(missing_ok=True)
+    if index_factory.needs_vector_sidecar(config):
+        index_factory.save_vectors(embeddings, index_path, config["vector_dtype"])
+    else:  # a sidecar left by an earlier build would shadow this index's vectors
+        index_factory.vectors_path(index_path).unlink(missing_ok=True)
 
-    print("Building FAISS index...")
-    index = build_index(embeddings)
+    if cache is not None:
+        cache.evict_stale()
 
-    INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(INDEX_PATH))
+    if bm25:
+        print("Building BM25 index...")
+        BM25Index.build(chunks).save(bm25_path)
+    else:  # the app would fuse a stale BM25 index's row IDs with this corpus
+        shutil.rmtree(bm25_path, ignore_errors=True)
 
-    with open(DOCS_PATH, 'w', encoding='utf-8') as f:
+    with open(docs_path, 'w', encoding='utf-8') as f:
         for entry in metadata:
             f.write(json.dumps(entry) + '\n')
+    write_doc_store(store_path(docs_path), metadata)
+
+    print(f"✅ FAISS index saved to {index_path}")
+    print(f"📄 Chunk metadata saved to {docs_path} and {store_path(docs_path)}")
+    if bm25:
+        print(f"BM25 index saved to {bm25_path}")
 
-    print(f"✅ FAISS index saved to {INDEX_PATH}")
-    print(f"📄 Chunk metadata saved to {DOCS_PATH}")
+def main(argv=None):
+    args = parse_args(argv)
+    build(index_factory.config_from_args(args),
+          use_embedding_cache=USE_EMBEDDING_CACHE and not args.no_embedding_cache, bm25=not args.no_bm25)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,122 @@
+# src/retrieval/reranker.py
+
+import hashlib
+import os
+import sys
+import threading
+import time
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.retrieval.query_cache import LRUCache
+
+RERANK_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+BUDGET_MS = 150.0         # per-request time budget for the rerank stage
+MAX_CONCURRENT = 2        # rerank forward passes allowed at once
+PAIR_CACHE_SIZE = 65536
+COST_SMOOTHING = 0.2      # EMA weight of the newest ms-per-pair measurement
+FIXED_OVERHEAD_MS = 5.0   # assumed per-call overhead before cost is measured
+INITIAL_MS_PER_PAIR = 10.0  # conservative cold-start cost, replaced by the first measurement
+MIN_MS_PER_PAIR = 1e-3    # floor for the cost estimate; a batch faster than the overhead measures 0
+
+
+def pair_key(query, text):
+    """Cache key of a (query, chunk) pair.
+
+    Keyed by the chunk's text rather than its row ID: row IDs are only
+    unique within one index, and the app shares one reranker between them.
+    """
+    return query, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class Reranker:
+    """Cross-encoder rerank stage with a latency budget.
+
+    All uncached (query, chunk) pairs are scored in one batched forward
+    pass. The number of pairs is cut to what the per-pair cost allows
+    within the budget; until the first batch is measured, a conservative
+    cost is assumed so the cold first request stays within budget too.
+    When no slot frees up in time, or the model fails, the FAISS order is
+    returned unchanged.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL_NAME, budget_ms=BUDGET_MS,
+                 max_concurrent=MAX_CONCURRENT, cache_size=PAIR_CACHE_SIZE, model=None):
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name)
+        self.model = model
+        self.budget_ms = budget_ms
+        self.pair_cache = LRUCache(cache_size)
+        self.ms_per_pair = INITIAL_MS_PER_PAIR
+        self.measured = False
+        self.overhead_ms = FIXED_OVERHEAD_MS
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def _affordable_pairs(self, remaining_ms):
+        return max(0, int((remaining_ms - self.overhead_ms) / max(self.ms_per_pair, MIN_MS_PER_PAIR)))
+
+    def _record_cost(self, n_pairs, elapsed_ms):
+        per_pair = max((elapsed_ms - self.overhead_ms) / n_pairs, MIN_MS_PER_PAIR)
+        if not self.measured:
+            self.ms_per_pair = per_pair
+            self.measured = True
+        else:
+            self.ms_per_pair += COST_SMOOTHING * (per_pair - self.ms_per_pair)
+
+    def rerank(self, query, row_ids, texts, budget_ms=None):
+        """Reorder candidates; returns ``(order, stats)``.
+
+        ``order`` holds indices into ``row_ids``: scored candidates by
+        descending score, then unscored ones in their original order.
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        start = time.perf_counter()
+        stats = {"candidates": len(row_ids), "scored": 0, "cached": 0, "fallback": None}
+        original = list(range(len(row_ids)))
+
+        def done(order, fallback=None):
+            stats["fallback"] = fallback
+            stats["latency_ms"] = (time.perf_counter() - start) * 1000
+            return order, stats
+
+        if not self._slots.acquire(timeout=budget_ms / 1000):
+            return done(original, "busy")
+        try:
+            scores = {}
+            uncached = []
+            for i in range(len(row_ids)):
+                score = self.pair_cache.get(pair_key(query, texts[i]))
+                if score is None:
+                    uncached.append(i)
+                else:
+                    scores[i] = score
+            stats["cached"] = len(scores)
+
+            remaining_ms = budget_ms - (time.perf_counter() - start) * 1000
+            limit = self._affordable_pairs(remaining_ms)
+            if limit < len(uncached):
+                uncached = uncached[:limit]  # keep the best FAISS-ranked pairs
+                stats["truncated_to"] = limit
+
+            if uncached:
+                t0 = time.perf_counter()
+                predicted = self.model.predict([(query, texts[i]) for i in uncached],
+                                               batch_size=len(uncached), show_progress_bar=False)
+                self._record_cost(len(uncached), (time.perf_counter() - t0) * 1000)
+                for i, score in zip(uncached, predicted):
+                    scores[i] = float(score)
+                    self.pair_cache.put(pair_key(query, texts[i]), float(score))
+                stats["scored"] = len(uncached)
+
+            if not scores:
+                return done(original, "budget")
+        except Exception as e:
+            return done(original, f"error: {type(e).__name__}")
+        finally:
+            self._slots.release()
+
+        ranked = sorted(scores, key=lambda i: -scores[i])
+        rest = [i for i in original if i not in scores]
+        return done(ranked + rest)
@@ -0,0 +1,60 @@
+# src/retrieval/retrieval_client.py
+
+import os
+
+import httpx
+import numpy as np
+
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 30.0
+MAX_CONNECTIONS = 16
+
+
+class RetrievalError(RuntimeError):
+    """Raised when the retrieval server rejects or fails a request."""
+
+
+def resolve_url(url=None):
+    """Server URL from the argument or ``RETRIEVAL_SERVER_URL``; None if unset."""
+    url = url or os.environ.get("RETRIEVAL_SERVER_URL")
+    if not url:
+        return None
+    if "://" not in url:
+        url = "http://" + url
+    return url.rstrip("/")
+
+
+class RetrievalClient:
+    """Pooled HTTP client for ``retrieval_server.py``."""
+
+    def __init__(self, url=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_connections=MAX_CONNECTIONS):
+        self.url = resolve_url(url)
+        if self.url is None:
+            raise ValueError("No retrieval server URL given and RETRIEVAL_SERVER_URL is not set")
+        self._client = httpx.Client(
+            base_url=self.url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    def search(self, query, index="rag", k=5):
+        """Return ``(distances, ids)`` arrays for one query."""
+        response = self._client.post("/search", json={"query": query, "index": index, "k": k})
+        if response.status_code != 200:
+            raise RetrievalError(f"Retrieval server returned {response.status_code}: {response.text}")
+        body = response.json()
+        return np.asarray(body["distances"], dtype=np.float32), np.asarray(body["ids"], dtype=np.int64)
+
+    def stats(self):
+        return self._client.get("/stats").json()
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,123 @@
+# src/retrieval/retrieval_server.py
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.retrieval.microbatch import MAX_BATCH_SIZE, MAX_WAIT_MS, MicroBatcher
+
+EMBED_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+INDEX_PATHS = {
+    "rag": os.environ.get('RAG_INDEX_PATH', 'data/processed/faiss_rag.index'),
+    "contextual": os.environ.get('CTX_INDEX_PATH', 'data/processed/faiss_contextual.index'),
+}
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8100
+MAX_K = 1000
+
+
+class RetrievalService:
+    """Encodes and searches queries in micro-batches.
+
+    Queries that arrive within one batching window are encoded in a single
+    forward pass (duplicates once) and each index gets one multi-row
+    ``search`` at the largest requested ``k``.
+    """
+
+    def __init__(self, model, indexes, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.indexes = indexes
+        self.batcher = MicroBatcher(self._run_batch, max_batch_size, max_wait_ms, name="retrieval-batcher")
+
+    def _run_batch(self, requests):
+        queries = list(dict.fromkeys(query for query, _, _ in requests))
+        vecs = self.model.encode(queries, batch_size=len(queries), convert_to_numpy=True)
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        row_of = {query: i for i, query in enumerate(queries)}
+
+        by_index = {}
+        for j, (_, name, _) in enumerate(requests):
+            by_index.setdefault(name, []).append(j)
+
+        results = [None] * len(requests)
+        for name, members in by_index.items():
+            k = max(requests[j][2] for j in members)
+            rows = [row_of[requests[j][0]] for j in members]
+            distances, ids = self.indexes[name].search(vecs[rows], k)
+            for n, j in enumerate(members):
+                k_j = requests[j][2]
+                results[j] = (distances[n, :k_j], ids[n, :k_j])
+        return results
+
+    def search(self, query, index="rag", k=5):
+        """``(distances, ids)`` for one query; blocks until its batch runs."""
+        if index not in self.indexes:
+            raise KeyError(index)
+        return self.batcher((query, index, k))
+
+    def stats(self):
+        return {"indexes": {name: int(idx.ntotal) for name, idx in self.indexes.items()},
+                "batching": self.batcher.stats()}
+
+    def close(self):
+        self.batcher.close()
+
+
+def create_app(service):
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel, Field
+
+    class SearchRequest(BaseModel):
+        query: str
+        index: str = "rag"
+        k: int = Field(5, ge=1, le=MAX_K)
+
+    app = FastAPI(title="Retrieval service")
+
+    # Plain ``def`` handlers run on the server's thread pool, so concurrent
+    # requests can block on the batcher together.
+    @app.post("/search")
+    def search(request: SearchRequest):
+        if request.index not in service.indexes:
+            raise HTTPException(404, f"Unknown index {request.index!r}; available: {sorted(service.indexes)}")
+        distances, ids = service.search(request.query, request.index, request.k)
+        return {"ids": ids.tolist(), "distances": distances.tolist()}
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    def stats():
+        return service.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching retrieval server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="How long the first query of a batch waits for company.")
+    args = parser.parse_args()
+
+    import uvicorn
+    from src.retrieval.embedding_backend import load_encoder
+    from src.retrieval.index_factory import load_index
+
+    print("Loading model and indexes...")
+    model = load_encoder(EMBED_MODEL_NAME)
+    indexes = {name: load_index(path) for name, path in INDEX_PATHS.items()}
+    service = RetrievalService(model, indexes, args.max_batch_size, args.max_wait_ms)
+    uvicorn.run(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
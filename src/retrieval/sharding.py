@@ -0,0 +1,322 @@
+# src/retrieval/sharding.py
+
+import json
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.retrieval import index_factory
+
+SHARD_TIMEOUT_S = 2.0
+NODE_START_TIMEOUT_S = 30.0   # a node must load its index and report its port within this
+AUTHKEY_ENV = "SHARD_NODE_AUTHKEY"
+SHARD_MODES = ("process", "local")
+
+
+def manifest_path(index_path):
+    """Sharded builds write ``<index>.shards.json`` instead of one index."""
+    return Path(str(index_path) + ".shards.json")
+
+
+def shard_path(index_path, shard):
+    index_path = Path(index_path)
+    return index_path.with_name(f"{index_path.stem}.shard{shard}{index_path.suffix}")
+
+
+def build_shards(embeddings, index_path, n_shards, config):
+    """Partition rows into contiguous ranges and build one index per range.
+
+    Shard ``i`` covers global rows ``[start, end)`` of the doc store; its
+    local row ``j`` is global row ``start + j``.
+    """
+    bounds = np.linspace(0, len(embeddings), n_shards + 1).astype(int)
+    shards = []
+    metric = "l2"
+    for i in range(n_shards):
+        start, end = int(bounds[i]), int(bounds[i + 1])
+        index = index_factory.build_index(embeddings[start:end], **config)
+        metric = "ip" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+        path = shard_path(index_path, i)
+        index_factory.save_index(index, path, config)
+        shards.append({"path": path.name, "start": start, "end": end})
+        print(f"  shard {i}: rows {start}-{end} → {path}")
+
+    manifest = {"shards": shards, "ntotal": int(len(embeddings)), "metric": metric, "config": config}
+    with open(manifest_path(index_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def merge_results(parts, k, metric="l2"):
+    """Merge per-shard ``(distances, global_ids)`` into the global top-k."""
+    distances = np.concatenate([d for d, _ in parts], axis=1)
+    ids = np.concatenate([i for _, i in parts], axis=1)
+    worst = -np.inf if metric == "ip" else np.inf
+    distances = np.where(ids < 0, worst, distances)
+    order = np.argsort(-distances if metric == "ip" else distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+# === Shard nodes ===
+def serve(index_path):
+    """Shard node: answer ``(queries, k)`` requests until the peer hangs up."""
+    index = index_factory.load_index(index_path)
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+    with Listener(("127.0.0.1", 0), authkey=authkey) as listener:
+        print(listener.address[1], flush=True)  # tells the coordinator where to connect
+        with listener.accept() as conn:
+            while True:
+                try:
+                    queries, k = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    conn.send(("ok",) + tuple(index.search(queries, k)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ShardError(RuntimeError):
+    pass
+
+
+class _Call:
+    """When a queued shard search was actually sent (``perf_counter``), or None."""
+
+    __slots__ = ("sent_at",)
+
+    def __init__(self):
+        self.sent_at = None
+
+
+class _ProcessShard:
+    """One shard served by its own node process.
+
+    Nodes are started with ``python sharding.py <index>`` rather than
+    through ``multiprocessing``, so they never re-import the caller's
+    main script (``app.py`` would otherwise load every model per shard).
+    """
+
+    def __init__(self, path, threads, search_env):
+        self.path = str(path)
+        # One worker per shard: requests are serialized on the connection
+        # anyway, and a slow node's backlog never takes another shard's thread.
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard")
+        self.threads = threads
+        self.search_env = search_env
+        self.proc = None
+        self.conn = None
+        self.broken = False
+        self.restarting = False
+        self._lock = threading.Lock()           # one request at a time on the connection
+        self._restart_lock = threading.Lock()
+        try:
+            self._start()
+        except Exception as e:
+            # Start degraded, like a node lost at runtime: the first query
+            # restarts it in the background.
+            print(f"⚠️ {e}; retrying on the next query")
+            self.broken = True
+
+    def _read_port(self, timeout):
+        line = []
+        reader = threading.Thread(target=lambda: line.append(self.proc.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(timeout)
+        if not line:
+            self.proc.kill()  # unblocks the reader
+            raise ShardError(f"Shard node for {self.path} did not start within {timeout:g}s")
+        return line[0].strip()
+
+    def _start(self, timeout=NODE_START_TIMEOUT_S):
+        authkey = secrets.token_bytes(32)
+        env = dict(os.environ, **self.search_env, **{AUTHKEY_ENV: authkey.hex()})
+        if self.threads:
+            env["OMP_NUM_THREADS"] = str(self.threads)
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.path],
+                                     stdout=subprocess.PIPE, env=env, text=True)
+        port = self._read_port(timeout)
+        if not port:
+            raise ShardError(f"Shard node for {self.path} exited with code {self.proc.wait()}")
+        self.conn = Client(("127.0.0.1", int(port)), authkey=authkey)
+        self.broken = False
+
+    def _restart(self):
+        try:
+            self.close()  # a request still waiting on the old node gets EOF and fails
+            with self._lock:
+                self._start()
+        except Exception as e:
+            print(f"⚠️ {e}; retrying on the next query")
+            self.broken = True
+        finally:
+            with self._restart_lock:
+                self.restarting = False
+
+    def _call(self, call, queries, k):
+        with self._lock:
+            try:
+                call.sent_at = time.perf_counter()
+                self.conn.send((queries, k))
+                reply = self.conn.recv()
+            except (EOFError, OSError) as e:
+                self.broken = True
+                raise ShardError(f"node connection lost: {e}") from e
+        if reply[0] == "error":
+            raise ShardError(reply[1])
+        return reply[1], reply[2]
+
+    def submit(self, queries, k):
+        """Queue a search. While a dead or timed-out node is restarted in the
+        background, this shard fails fast instead of stalling the query."""
+        with self._restart_lock:
+            if not self.restarting and (self.broken or self.proc is None or self.proc.poll() is not None):
+                self.restarting = True
+                threading.Thread(target=self._restart, name="shard-restart", daemon=True).start()
+            if self.restarting:
+                raise ShardError("node is restarting")
+        call = _Call()
+        future = self.pool.submit(self._call, call, queries, k)
+        future.call = call
+        return future
+
+    def mark_broken(self):
+        # A late reply would desynchronize the connection, so a shard that
+        # timed out gets a fresh node on its next request.
+        self.broken = True
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def shutdown(self):
+        self.close()
+        self.pool.shutdown(wait=False)
+
+
+class _LocalShard:
+    """In-process stand-in node; FAISS releases the GIL while searching."""
+
+    def __init__(self, path, nprobe=None, ef_search=None, mmap=None):
+        self.index = index_factory.load_index(path, nprobe, ef_search, mmap)
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard")
+
+    def _call(self, call, queries, k):
+        call.sent_at = time.perf_counter()
+        return self.index.search(queries, k)
+
+    def submit(self, queries, k):
+        call = _Call()
+        future = self.pool.submit(self._call, call, queries, k)
+        future.call = call
+        return future
+
+    def mark_broken(self):
+        pass
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+class ShardedSearcher:
+    """Scatter a search to every shard in parallel and gather the top-k.
+
+    Exposes the FAISS ``search(x, k) -> (D, I)`` interface with global row
+    IDs. Shards that fail, or do not answer within ``timeout_s`` of the
+    search reaching them, are left out of that result; ``search_partial`` also returns which ones, per call. A node
+    that failed to start, died or timed out is restarted in the background
+    from its next query on. Only if every shard fails does a search raise.
+    """
+
+    def __init__(self, index_path, mode="process", timeout_s=SHARD_TIMEOUT_S, threads_per_shard=None,
+                 nprobe=None, ef_search=None, mmap=None):
+        with open(manifest_path(index_path), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.ntotal = self.manifest["ntotal"]
+        self.metric = self.manifest["metric"]
+        self.metric_type = faiss.METRIC_INNER_PRODUCT if self.metric == "ip" else faiss.METRIC_L2
+        self.timeout_s = timeout_s
+        self.offsets = [s["start"] for s in self.manifest["shards"]]
+
+        base = Path(index_path).parent
+        paths = [base / s["path"] for s in self.manifest["shards"]]
+        if mode == "process":
+            search_env = {name: str(value) for name, value in
+                          (("FAISS_NPROBE", nprobe), ("FAISS_EF_SEARCH", ef_search)) if value is not None}
+            if mmap is not None:
+                search_env["FAISS_MMAP"] = "1" if mmap else "0"
+            self.shards = [_ProcessShard(p, threads_per_shard, search_env) for p in paths]
+        elif mode == "local":
+            self.shards = [_LocalShard(p, nprobe, ef_search, mmap) for p in paths]
+        else:
+            raise ValueError(f"Unknown shard mode: {mode!r} (expected one of {SHARD_MODES})")
+
+    def search(self, queries, k):
+        distances, ids, _ = self.search_partial(queries, k)
+        return distances, ids
+
+    def search_partial(self, queries, k):
+        """``(D, I, failed)``; ``failed`` lists the shards missing from this result."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        futures, failed = {}, []
+        for i, shard in enumerate(self.shards):
+            try:
+                futures[shard.submit(queries, k)] = i
+            except Exception as e:
+                failed.append({"shard": i, "error": f"{type(e).__name__}: {e}"})
+        done, pending = wait(futures, timeout=self.timeout_s)
+
+        # A search still queued behind others on its shard is dropped, but the
+        # node is fine. One already sent gets the rest of ``timeout_s``
+        # measured from the send; only then is its node presumed stuck.
+        done = list(done)
+        for future in pending:
+            i = futures[future]
+            if future.cancel():
+                failed.append({"shard": i, "error": "timeout (queued)"})
+                continue
+            sent_at = future.call.sent_at or time.perf_counter()
+            remaining = self.timeout_s - (time.perf_counter() - sent_at)
+            if wait([future], timeout=max(0.0, remaining)).done:
+                done.append(future)
+            else:
+                failed.append({"shard": i, "error": "timeout"})
+                self.shards[i].mark_broken()
+
+        parts = []
+        for future in done:
+            i = futures[future]
+            try:
+                distances, ids = future.result()
+            except Exception as e:
+                failed.append({"shard": i, "error": f"{type(e).__name__}: {e}"})
+                continue
+            parts.append((distances, np.where(ids >= 0, ids + self.offsets[i], -1)))
+
+        failed.sort(key=lambda f: f["shard"])
+        if not parts:
+            raise RuntimeError(f"All {len(self.shards)} shards failed: {failed}")
+        return merge_results(parts, k, self.metric) + (failed,)
+
+    def close(self):
+        for shard in self.shards:
+            shard.shutdown()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
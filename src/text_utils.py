@@ -0,0 +1,10 @@
+# src/text_utils.py
+
+import re
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n{2,}')
+
+
+def split_sentences(text):
+    """Non-empty sentences of ``text``, split after ``.!?`` and at blank lines."""
+    return [s for s in SENTENCE_BOUNDARY.split(text) if s.strip()]
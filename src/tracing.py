@@ -0,0 +1,313 @@
+# src/tracing.py
+
+import itertools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.environ.get("TRACING", "0") == "1"
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH", "traces.jsonl")  # "" disables the JSONL sink
+METRICS_PORT = os.environ.get("METRICS_PORT")  # Prometheus text endpoint, if set
+METRIC_PREFIX = "rag"
+# Histogram buckets in seconds: sub-millisecond cache work up to slow generations
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_ids = itertools.count(1)
+_sink_lock = threading.Lock()
+_sink = None
+
+
+def configure(enabled=None, log_path=None):
+    """Override the ``TRACING`` / ``TRACE_LOG_PATH`` settings at runtime."""
+    global ENABLED, TRACE_LOG_PATH, _sink
+    with _sink_lock:
+        if enabled is not None:
+            ENABLED = enabled
+        if log_path is not None and log_path != TRACE_LOG_PATH:
+            if _sink is not None:
+                _sink.close()
+                _sink = None
+            TRACE_LOG_PATH = log_path
+
+
+def _write(record):
+    global _sink
+    if not TRACE_LOG_PATH:
+        return
+    line = json.dumps(record, ensure_ascii=False)
+    with _sink_lock:
+        if _sink is None:
+            _sink = open(TRACE_LOG_PATH, "a", encoding="utf-8", buffering=1)
+        _sink.write(line + "\n")
+
+
+# === Metrics ===
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Registry:
+    """Counters and histograms, rendered in the Prometheus text format.
+
+    Collectors are read at scrape time; they expose counters that already
+    live elsewhere (cache hit counts) without double bookkeeping.
+    """
+
+    def __init__(self, prefix=METRIC_PREFIX, buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._counters = {}     # name -> {label key -> value}
+        self._histograms = {}   # name -> {label key -> [bucket counts..., sum, count]}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+            state[-2] += seconds
+            state[-1] += 1
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def register_collector(self, fn):
+        """``fn()`` returns ``[(name, labels, value, type), ...]`` at scrape time."""
+        self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+
+        def header(name, kind):
+            full = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            histograms = {n: {k: list(v) for k, v in s.items()} for n, s in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            full = header(name, "counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}{_format_labels(key)} {value}")
+
+        for name, series in sorted(histograms.items()):
+            full = header(name, "histogram")
+            for key, state in sorted(series.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{full}_bucket{_format_labels(key, [('le', repr(bound))])} {count}")
+                lines.append(f"{full}_bucket{_format_labels(key, [('le', '+Inf')])} {state[-1]}")
+                lines.append(f"{full}_sum{_format_labels(key)} {state[-2]:.6f}")
+                lines.append(f"{full}_count{_format_labels(key)} {state[-1]}")
+
+        collected = {}
+        for fn in self._collectors:
+            for name, labels, value, kind in fn():
+                collected.setdefault((name, kind), []).append((_label_key(labels), value))
+        for (name, kind), samples in sorted(collected.items()):
+            full = header(name, kind)
+            for key, value in sorted(samples):
+                lines.append(f"{full}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("requests_total", "Traced requests by pipeline.")
+registry.describe("errors_total", "Exceptions by pipeline, stage and type.")
+registry.describe("request_seconds", "End-to-end request latency.")
+registry.describe("stage_seconds", "Latency of each pipeline stage.")
+
+
+def incr(name, value=1, **labels):
+    """Bump a counter; a no-op while tracing is disabled."""
+    if ENABLED:
+        registry.incr(name, value, **labels)
+
+
+# === Spans ===
+def _count_error(exc, pipeline, stage):
+    """Count an exception once, at the innermost span it passed through."""
+    if getattr(exc, "_traced", False):
+        return
+    registry.incr("errors_total", pipeline=pipeline, stage=stage, type=type(exc).__name__)
+    try:
+        exc._traced = True
+    except AttributeError:
+        pass
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+class _NoopTrace:
+    """Stand-in returned while tracing is disabled; every method is a no-op."""
+
+    __slots__ = ()
+    trace_id = None
+
+    def span(self, name, **attrs):
+        return _NOOP_SPAN
+
+    def add(self, name, seconds, **attrs):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+NOOP_TRACE = _NoopTrace()
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "_start")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = exc_type.__name__
+            _count_error(exc, self.trace.name, self.name)
+        self.trace._record(self.name, self._start, seconds, self.attrs)
+        return False
+
+
+class Trace:
+    """Spans of one request, written as one JSONL record on ``finish()``.
+
+    The trace object is passed explicitly rather than kept in a context
+    variable: Gradio resumes streaming handlers on arbitrary worker
+    threads, so thread- or context-local state would not follow the request.
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.trace_id = f"{os.getpid()}-{next(_ids)}"
+        self.attrs = attrs
+        self.spans = []
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def span(self, name, **attrs):
+        """Context manager timing one stage."""
+        return Span(self, name, attrs)
+
+    def add(self, name, seconds, **attrs):
+        """Record a stage measured by the caller (e.g. time to first token)."""
+        self._record(name, time.perf_counter() - seconds, seconds, attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def _record(self, name, start, seconds, attrs):
+        registry.observe("stage_seconds", seconds, pipeline=self.name, stage=name)
+        span = {"name": name, "start_ms": round((start - self._start) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3)}
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, error=None):
+        """Close the trace; later calls are ignored."""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        seconds = time.perf_counter() - self._start
+        registry.incr("requests_total", pipeline=self.name)
+        registry.observe("request_seconds", seconds, pipeline=self.name)
+        if error is not None:
+            _count_error(error, self.name, "request")
+        record = {"trace_id": self.trace_id, "name": self.name, "timestamp": self._wall,
+                  "duration_ms": round(seconds * 1000, 3), "attrs": self.attrs, "spans": self.spans}
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        _write(record)
+
+
+def start_trace(name, **attrs):
+    """A new ``Trace``, or the shared no-op trace while tracing is disabled."""
+    if not ENABLED:
+        return NOOP_TRACE
+    return Trace(name, **attrs)
+
+
+# === Prometheus endpoint ===
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds would flood the console
+
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """Serve ``/metrics`` on a daemon thread; returns the server."""
+    port = int(port if port is not None else METRICS_PORT)
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
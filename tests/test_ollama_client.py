@@ -0,0 +1,44 @@
+import httpx
+import pytest
+
+from src.generation.ollama_client import OllamaClient
+from src.generation.ollama_stub import StubOllamaServer
+
+
+@pytest.fixture
+def stub():
+    with StubOllamaServer(reply="one two three") as server:
+        yield server
+
+
+def test_stream_yields_tokens_and_per_call_stats(stub):
+    with OllamaClient(stub.url) as client:
+        completion = client.stream("a short prompt", model="stub:latest")
+        assert list(completion) == ["one ", "two ", "three "]
+        assert completion.stats["done"] is True
+        assert completion.stats["eval_count"] == 3
+        assert completion.stats["prompt_eval_count"] == 3
+
+
+def test_requests_reuse_one_connection(stub):
+    with OllamaClient(stub.url) as client:
+        answers = [client.generate(f"question {i}") for i in range(5)]
+    assert answers == ["one two three "] * 5
+    assert stub.requests == 5
+    assert stub.connections == 1
+
+
+def test_read_timeout_while_waiting_for_first_token():
+    with StubOllamaServer(first_token_delay=1.0) as server:
+        with OllamaClient(server.url, read_timeout=0.1) as client:
+            with pytest.raises(httpx.ReadTimeout):
+                client.generate("slow")
+
+
+def test_pool_timeout_when_all_connections_are_busy(stub):
+    with OllamaClient(stub.url, max_connections=1, pool_timeout=0.1) as client:
+        busy = iter(client.stream("holds the only connection"))
+        next(busy)
+        with pytest.raises(httpx.PoolTimeout):
+            client.generate("waits for a connection")
+        busy.close()